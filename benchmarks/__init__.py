@@ -0,0 +1,13 @@
+"""
+Benchmarks für die HPGL-Verarbeitung.
+
+    python -m benchmarks --help
+
+Die Module aus plot-ui werden wie in tools/plottool.py über sys.path gefunden.
+"""
+import os
+import sys
+
+PLOT_UI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plot-ui")
+if PLOT_UI not in sys.path:
+    sys.path.append(PLOT_UI)
@@ -0,0 +1,195 @@
+# __main__.py
+"""
+Misst die Schritte von HPGL auf synthetischen Aufträgen und schreibt je
+Schritt Zeit, Speicherspitze, Ausgabegröße, Länge der Leerfahrten und
+geschätzte Schneidedauer als JSON, um Commits miteinander vergleichen zu
+können.
+
+    python -m benchmarks                        # alle Aufträge
+    python -m benchmarks -w long_curve -s 0.1   # ein Auftrag, verkleinert
+    python -m benchmarks --compare alt.json neu.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.workloads import WORKLOADS
+from hpgl import HPGL
+from hpgl_estimate import estimate
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+NEAREST_LIMIT = 3000  # rerouteNearest ist quadratisch in der Pfadzahl, darüber wird es übersprungen
+
+STAGES = ("parse", "optimize", "optimizeCut", "bladeOffset", "rerouteXY", "rerouteNearest",
+          "getHPGL", "exportSVG")
+
+
+def describe(hpgl):
+    """Umfang, Wege und geschätzte Schneidedauer der aktuellen Geometrie."""
+    paths = hpgl.getPaths()
+    travel, cut = hpgl.getLength()
+    return {"paths": len(paths), "points": sum(len(path) for path in paths),
+            "travel_mm": round(travel, 1), "cut_mm": round(cut, 1),
+            "eta_s": round(estimate(hpgl).total, 1)}
+
+
+def run_pipeline(data, svg_file, nearest_limit=NEAREST_LIMIT, memory=False, details=False):
+    """
+    Führt alle Schritte einmal in der Reihenfolge von HPGLPlotter.configure()
+    mit magic aus. rerouteNearest läuft als Alternative zu rerouteXY auf
+    einer Kopie der Pfade davor, damit beide Strategien vergleichbar sind.
+
+    :param memory: Speicherspitze je Schritt mit tracemalloc messen (verlangsamt)
+    :param details: Pfade, Punkte, Wege und Ausgabegröße nach jedem Schritt erfassen
+    :return: Messwerte je Schritt
+    """
+    results = {}
+
+    def measure(name, function, subject=None):
+        if memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        output = function()
+        result = {"seconds": time.perf_counter() - started}
+        if memory:
+            result["peak_kib"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            tracemalloc.stop()
+        if details and subject is not None:
+            result.update(describe(subject))
+        results[name] = result
+        return output
+
+    hpgl = HPGL(None)
+    measure("parse", lambda: hpgl.parse(data), hpgl)
+    measure("optimize", lambda: (hpgl.optimize(), hpgl.fit()), hpgl)
+    measure("optimizeCut", lambda: hpgl.optimizeCut(0.25), hpgl)
+    measure("bladeOffset", lambda: hpgl.bladeOffset(0.25), hpgl)
+    nearest = HPGL(None)
+    nearest.routes = [list(path) for path in hpgl.getPaths()]
+    measure("rerouteXY", hpgl.rerouteXY, hpgl)
+    if len(nearest.routes) <= nearest_limit:
+        measure("rerouteNearest", nearest.rerouteNearest, nearest)
+    else:
+        results["rerouteNearest"] = {"skipped": f"{len(nearest.routes)} paths > {nearest_limit}"}
+    output = measure("getHPGL", hpgl.getHPGL)
+    measure("exportSVG", lambda: hpgl.exportSVG(svg_file))
+    if details:
+        results["getHPGL"]["bytes"] = len(output.encode())
+        results["exportSVG"]["bytes"] = os.path.getsize(svg_file)
+    return results
+
+
+def benchmark(name, scale=1.0, repeat=3, memory=True, nearest_limit=NEAREST_LIMIT):
+    """Misst einen Auftrag: kleinste Zeit aus repeat Läufen, Speicher in einem eigenen Lauf."""
+    data = WORKLOADS[name](scale)
+    with tempfile.TemporaryDirectory() as directory:
+        svg_file = os.path.join(directory, "preview.svg")
+        runs = [run_pipeline(data, svg_file, nearest_limit, details=(number == 0))
+                for number in range(repeat)]
+        stages = runs[0]
+        for stage, result in stages.items():
+            if "seconds" in result:
+                result["seconds"] = round(min(run[stage]["seconds"] for run in runs), 4)
+        if memory:
+            for stage, result in run_pipeline(data, svg_file, nearest_limit, memory=True).items():
+                if "peak_kib" in result:
+                    stages[stage]["peak_kib"] = result["peak_kib"]
+    return {"input_bytes": len(data), "stages": stages}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results):
+    for name, workload in results["workloads"].items():
+        print(f"{name} ({workload['input_bytes']} bytes)")
+        for stage in STAGES:
+            result = workload["stages"][stage]
+            if "skipped" in result:
+                print(f"  {stage:15} skipped: {result['skipped']}")
+                continue
+            line = f"  {stage:15} {result['seconds']:9.3f}s"
+            if "peak_kib" in result:
+                line += f" {result['peak_kib']:10.0f} KiB"
+            if "travel_mm" in result:
+                line += (f"  travel {result['travel_mm']:10.1f} mm  {result['points']:8d} points"
+                         f"  eta {result['eta_s']:8.1f}s")
+            if "bytes" in result:
+                line += f"  {result['bytes']:10d} bytes"
+            print(line)
+
+
+def compare(old_file, new_file):
+    """Zeitverhältnis und Änderung der Leerfahrt je Schritt zwischen zwei Ergebnisdateien."""
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    for name, workload in new["workloads"].items():
+        if name not in old["workloads"]:
+            continue
+        print(name)
+        for stage in STAGES:
+            before = old["workloads"][name]["stages"].get(stage, {})
+            after = workload["stages"].get(stage, {})
+            if "seconds" not in before or "seconds" not in after:
+                continue
+            ratio = after["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+            line = f"  {stage:15} {before['seconds']:9.3f}s -> {after['seconds']:9.3f}s  x{ratio:5.2f}"
+            if "travel_mm" in before and "travel_mm" in after:
+                line += f"  travel {after['travel_mm'] - before['travel_mm']:+.1f} mm"
+            if "eta_s" in before and "eta_s" in after:
+                line += f"  eta {after['eta_s'] - before['eta_s']:+.1f}s"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("python -m benchmarks", description="HPGL stage benchmarks")
+    parser.add_argument("-w", "--workload", action="append", choices=sorted(WORKLOADS),
+                        help="Workload to run (repeatable, default: all)")
+    parser.add_argument("-s", "--scale", type=float, default=1.0,
+                        help="Workload size factor, e.g. 0.1 for a quick run")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Timed runs per workload")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run")
+    parser.add_argument("--nearest-limit", type=int, default=NEAREST_LIMIT,
+                        help="Skip rerouteNearest above this many paths")
+    parser.add_argument("-o", "--output", help="JSON file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    results = {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "workloads": {},
+    }
+    for name in args.workload or sorted(WORKLOADS):
+        print(f"running {name}...", file=sys.stderr)
+        results["workloads"][name] = benchmark(name, args.scale, args.repeat,
+                                               not args.no_memory, args.nearest_limit)
+    output = args.output or os.path.join(RESULTS_DIR, results["commit"] + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=1)
+    print_results(results)
+    print(f"results written to {output}")
@@ -0,0 +1,95 @@
+# imports.py
+"""
+Misst die Importzeit der Module in einem frischen Interpreter, also das,
+was GUI und Kommandozeilenwerkzeuge beim Start bezahlen.
+
+    python -m benchmarks.imports
+    python -m benchmarks.imports -m hpgl_plotter -r 10 --top 10
+
+plotUI.py baut beim Import das Fenster auf, gemessen werden daher nur
+seine Import-Anweisungen.
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+
+PLOT_UI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plot-ui")
+MODULES = ("hpgl", "hpgl_estimate", "hpgl_reroute", "hpgl_transport", "hpgl_plotter",
+           "hpgl_spooler", "hpgl_preview", "hpgl_tiles", "plotUI")
+
+TIMED = """
+import time
+started = time.perf_counter()
+{code}
+print(time.perf_counter() - started)
+"""
+
+
+def import_code(module):
+    """Python-Code, der module importiert, bei plotUI nur dessen Import-Anweisungen."""
+    if module != "plotUI":
+        return f"import {module}"
+    with open(os.path.join(PLOT_UI, "plotUI.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(module, repeat=5):
+    """
+    Kleinste Importzeit aus repeat Läufen in je einem neuen Prozess.
+
+    :return: (Sekunden für den Import, Sekunden für den ganzen Prozess)
+    """
+    code = TIMED.format(code=import_code(module))
+    imports = process = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=PLOT_UI)
+        elapsed = time.perf_counter() - started
+        seconds = float(output.decode().split()[-1])
+        imports = seconds if imports is None else min(imports, seconds)
+        process = elapsed if process is None else min(process, elapsed)
+    return imports, process
+
+
+def heaviest(module, top=5):
+    """Die top Module mit der größten eigenen Importzeit laut python -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", import_code(module)],
+                            cwd=PLOT_UI, capture_output=True, check=True)
+    modules = []
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        modules.append((int(own) / 1e6, name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("python -m benchmarks.imports", description="Module import times")
+    parser.add_argument("-m", "--module", action="append", choices=MODULES,
+                        help="Module to measure (repeatable, default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=3, help="Heaviest imported modules to list")
+    parser.add_argument("-o", "--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.module or MODULES:
+        try:
+            imports, process = measure(module, args.repeat)
+        except subprocess.CalledProcessError:
+            print(f"{module:15} import failed (missing dependency?)")
+            continue
+        results[module] = {"import_s": round(imports, 4), "process_s": round(process, 4),
+                           "heaviest": heaviest(module, args.top)}
+        print(f"{module:15} {imports * 1000:7.1f} ms import {process * 1000:7.1f} ms process  "
+              + ", ".join(f"{name} {seconds * 1000:.1f}" for seconds, name in results[module]["heaviest"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
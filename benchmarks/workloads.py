@@ -0,0 +1,132 @@
+# workloads.py
+"""
+Synthetische HPGL-Aufträge für Benchmarks.
+
+Jeder Generator liefert HPGL-Text wie ihn Inkscape oder eine
+Plotter-Software erzeugen würde. Zufallswerte sind fest geseedet, damit
+Messungen über Commits hinweg vergleichbar bleiben. scale verkleinert
+oder vergrößert die Menge (z. B. 0.1 für einen schnellen Durchlauf).
+"""
+import math
+import random
+
+HEADER = "IN;PA;"
+FOOTER = "PU0,0;SP0;"
+
+
+def _path(points):
+    """Ein Pfad als PU zum Start und ein PD mit allen weiteren Punkten."""
+    x, y = points[0]
+    coordinates = ",".join(f"{x},{y}" for x, y in points[1:])
+    return f"PU{x},{y};PD{coordinates};"
+
+
+def _polygon(cx, cy, radius, corners, phase=0.0):
+    points = [(round(cx + radius * math.cos(phase + 2 * math.pi * i / corners)),
+               round(cy + radius * math.sin(phase + 2 * math.pi * i / corners)))
+              for i in range(corners)]
+    return points + points[:1]
+
+
+def dense_text(scale=1.0, seed=1):
+    """Zeilen kleiner Buchstaben (4 mm), je 2 bis 5 kurze Striche aus wenigen Punkten."""
+    rng = random.Random(seed)
+    chars = max(int(4000 * scale), 1)
+    size = 160  # HPGL-Einheiten, 4 mm
+    per_row = 80
+    out = [HEADER]
+    for number in range(chars):
+        left = (number % per_row) * size * 1.2
+        bottom = (number // per_row) * size * 1.6
+        for _ in range(rng.randint(2, 5)):
+            points = [(round(left + rng.uniform(0, size)), round(bottom + rng.uniform(0, size)))
+                      for _ in range(rng.randint(2, 8))]
+            out.append(_path(points))
+    out.append(FOOTER)
+    return "".join(out)
+
+
+def nested_contours(scale=1.0, seed=2):
+    """Gruppen verschachtelter, geschlossener Konturen (z. B. Buchstaben mit Innenräumen)."""
+    rng = random.Random(seed)
+    groups = max(int(300 * scale), 1)
+    out = [HEADER]
+    for _ in range(groups):
+        cx, cy = rng.randint(0, 40000), rng.randint(0, 40000)
+        radius = rng.randint(400, 1600)
+        for depth in range(rng.randint(2, 6)):
+            out.append(_path(_polygon(cx, cy, radius * (1 - 0.18 * depth),
+                                      rng.randint(24, 120), rng.uniform(0, math.pi))))
+    out.append(FOOTER)
+    return "".join(out)
+
+
+def fragmented(scale=1.0, seed=3):
+    """
+    Wie ein Inkscape-Export: ein PD je Punkt, Kurven in viele kurze Stücke
+    zerlegt, deren Enden aneinander anschließen, in ungünstiger Reihenfolge.
+    """
+    rng = random.Random(seed)
+    curves = max(int(400 * scale), 1)
+    pieces = []
+    for _ in range(curves):
+        cx, cy = rng.randint(0, 40000), rng.randint(0, 40000)
+        radius = rng.randint(300, 3000)
+        points = _polygon(cx, cy, radius, rng.randint(60, 240))
+        start = 0
+        while start < len(points) - 1:
+            end = min(start + rng.randint(1, 4), len(points) - 1)
+            pieces.append(points[start:end + 1])
+            start = end
+    rng.shuffle(pieces)
+    out = [HEADER]
+    for points in pieces:
+        out.append("PU%d,%d;" % points[0])
+        out.extend("PD%d,%d;" % point for point in points[1:])
+    out.append(FOOTER)
+    return "".join(out)
+
+
+def long_curve(scale=1.0, seed=4):
+    """Eine einzige Spirale mit 1e6 Punkten (bei scale=1)."""
+    count = max(int(1000000 * scale), 2)
+    turns = 200
+    points = []
+    for i in range(count):
+        angle = 2 * math.pi * turns * i / count
+        radius = 200 + 19000 * i / count
+        points.append((round(20000 + radius * math.cos(angle)),
+                       round(20000 + radius * math.sin(angle))))
+    return HEADER + _path(points) + FOOTER
+
+
+def step_and_repeat(scale=1.0, seed=5):
+    """Bogen mit vielen gleichen Aufklebern (Stern mit Rand) im Raster."""
+    rng = random.Random(seed)
+    count = max(int(400 * scale), 1)
+    columns = max(int(math.sqrt(count)), 1)
+    motif = []
+    star = []
+    for i in range(2 * 12):
+        radius = 700 if i % 2 == 0 else 300
+        star.append((radius * math.cos(math.pi * i / 12), radius * math.sin(math.pi * i / 12)))
+    motif.append(star + star[:1])
+    motif.append([(x * 1.3, y * 1.3) for x, y in _polygon(0, 0, 800, 64)])
+    motif.append([(x, y) for x, y in _polygon(0, 0, 120, 16)])
+    out = [HEADER]
+    for number in range(count):
+        ox = (number % columns) * 2400 + rng.randint(-5, 5)
+        oy = (number // columns) * 2400 + rng.randint(-5, 5)
+        for path in motif:
+            out.append(_path([(round(ox + x), round(oy + y)) for x, y in path]))
+    out.append(FOOTER)
+    return "".join(out)
+
+
+WORKLOADS = {
+    "dense_text": dense_text,
+    "nested_contours": nested_contours,
+    "fragmented": fragmented,
+    "long_curve": long_curve,
+    "step_and_repeat": step_and_repeat,
+}
@@ -3,6 +3,12 @@ from __future__ import division
 from __future__ import print_function
 import re
 import math
+import os
+import time
+import contextlib
+import glob
+import hashlib
+from collections import OrderedDict
 
 # define xrange, to be compatible with python3 and python2
 try:
@@ -111,8 +117,8 @@ def path_median(path):
 	xvals, yvals = zip(*path)
 	min_x = min(xvals)
 	min_y = min(yvals)
-	xvals = map(lambda x: x - min_x, xvals)
-	yvals = map(lambda y: y - min_y, yvals)
+	xvals = list(map(lambda x: x - min_x, xvals))
+	yvals = list(map(lambda y: y - min_y, yvals))
 	xmedian = sorted(xvals)[int(math.ceil(len(xvals) // 2))]
 	ymedian = sorted(yvals)[int(math.ceil(len(yvals) // 2))]
 
@@ -124,8 +130,8 @@ def path_mean(path):
 	xvals, yvals = zip(*path)
 	min_x = min(xvals)
 	min_y = min(yvals)
-	xvals = map(lambda x: x - min_x, xvals)
-	yvals = map(lambda y: y - min_y, yvals)
+	xvals = list(map(lambda x: x - min_x, xvals))
+	yvals = list(map(lambda y: y - min_y, yvals))
 	xmean = sum(xvals) / len(xvals)
 	ymean = sum(yvals) / len(yvals)
 
@@ -133,6 +139,242 @@ def path_mean(path):
 	return start, start
 
 
+class StageTimer(object):
+	"""
+	Measures the stages of a preparation run.
+
+		timer = StageTimer(log=print)
+		with timer.stage("rerouteXY"):
+			hpgl.rerouteXY()
+		timer.summary()
+
+	profile is a comma separated list: "cprofile" records a cProfile over
+	all stages, "memory" the tracemalloc peak of each stage. When not given,
+	it is read from the HPGL_PROFILE environment variable. The profiling
+	modules are only imported when asked for, they noticeably slow down
+	the start.
+	"""
+
+	def __init__(self, log=None, profile=None):
+		if profile is None:
+			profile = os.environ.get("HPGL_PROFILE", "")
+		self.log = log or print
+		self.kinds = set(kind.strip() for kind in profile.split(",") if kind.strip())
+		self.tracemalloc = None
+		if "memory" in self.kinds:
+			try:
+				import tracemalloc
+				self.tracemalloc = tracemalloc
+			except ImportError:  # python2
+				pass
+		self.profiler = None
+		if "cprofile" in self.kinds:
+			import cProfile
+			self.profiler = cProfile.Profile()
+		self.stages = []
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		tracemalloc = self.tracemalloc
+		tracing = tracemalloc is not None and not tracemalloc.is_tracing()
+		if tracing:
+			tracemalloc.start()
+		if self.profiler is not None:
+			self.profiler.enable()
+		started = time.time()
+		try:
+			yield
+		finally:
+			seconds = time.time() - started
+			if self.profiler is not None:
+				self.profiler.disable()
+			peak = None
+			if tracing:
+				peak = tracemalloc.get_traced_memory()[1]
+				tracemalloc.stop()
+			self.stages.append((name, seconds, peak))
+
+	def summary(self, top=10):
+		"""Logs the recorded stages (and profile) and starts over"""
+		if not self.stages:
+			return
+		total = sum(seconds for _, seconds, _ in self.stages)
+		if not self.kinds:
+			self.log("Timing: " + ", ".join("{} {:.3f}s".format(name, seconds) for name, seconds, _ in self.stages)
+				+ ", total {:.3f}s".format(total))
+		else:
+			self.log("Stage timings:")
+			for name, seconds, peak in self.stages:
+				line = "  {:15} {:8.3f}s {:5.1f}%".format(name, seconds, 100.0 * seconds / total if total else 0)
+				if peak is not None:
+					line += "  peak {:.0f} KiB".format(peak / 1024.0)
+				self.log(line)
+			self.log("  {:15} {:8.3f}s".format("total", total))
+		if self.profiler is not None:
+			import cProfile
+			import pstats
+			try:
+				from StringIO import StringIO
+			except ImportError:
+				from io import StringIO
+			stream = StringIO()
+			pstats.Stats(self.profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+			for line in stream.getvalue().splitlines():
+				if line.strip():
+					self.log(line)
+			self.profiler = cProfile.Profile()
+		self.stages = []
+
+
+def route_key(routes):
+	"""Hash of a route list, identifies the input of a Pipeline"""
+	digest = hashlib.sha1()
+	for path in routes:
+		digest.update(repr(path).encode())
+	return digest.hexdigest()
+
+
+def _stage_scale(hpgl, width):
+	hpgl.scaleToWidth(width)
+
+
+def _stage_orient(hpgl, rotate180, mirror):
+	if rotate180:
+		hpgl.mirrorX()
+		hpgl.mirrorY()
+	if mirror:
+		hpgl.mirrorX()
+
+
+def _stage_optimize(hpgl, optimize):
+	hpgl.optimize()
+	hpgl.fit()
+
+
+def _stage_blade_offset(hpgl, blade_offset):
+	hpgl.optimizeCut(blade_offset)
+	hpgl.bladeOffset(blade_offset)
+
+
+def _stage_reroute(hpgl, reroute):
+	hpgl.rerouteXY()
+
+
+# (name, function, parameter names) in the order they are applied. A stage
+# is skipped while all its parameters are None or False.
+PREPARE_STAGES = [
+	("scale", _stage_scale, ("width",)),
+	("orient", _stage_orient, ("rotate180", "mirror")),
+	("optimize", _stage_optimize, ("optimize",)),
+	("bladeOffset", _stage_blade_offset, ("blade_offset",)),
+	("reroute", _stage_reroute, ("reroute",)),
+]
+
+PIPELINE_CACHE = 16  # stage results kept by a Pipeline
+
+
+def prepare_options(magic=False, width=None, mirror=False, pen=False):
+	"""Stage parameters for the usual command line options"""
+	return {
+		"width": width,
+		"rotate180": magic,
+		"mirror": mirror,
+		"optimize": magic,
+		"blade_offset": 0.25 if magic and not pen else None,
+		"reroute": magic,
+	}
+
+
+class Pipeline(object):
+	"""
+	Runs the preparation stages on a HPGL object.
+
+		pipeline = Pipeline()
+		pipeline.run(hpgl, prepare_options(magic=True, width=300))
+
+	The result of every stage is kept under a hash of its input and its
+	parameters. Running again with one parameter changed (or on a file with
+	the same content) only recomputes the stages from the changed one on.
+
+	:param stages: list like PREPARE_STAGES
+	:param timer: StageTimer that records the stages actually computed
+	:param store: optional persistent cache with get(key) and put(key, routes),
+	              e.g. hpgl_cache.PreparedCache. It is asked for results not
+	              in memory and gets the final result of every computed run.
+	"""
+
+	def __init__(self, stages=None, timer=None, cache_size=PIPELINE_CACHE, store=None):
+		self.stages = list(stages or PREPARE_STAGES)
+		self.timer = timer or StageTimer(log=lambda message: None)
+		self.cache_size = cache_size
+		self.cache = OrderedDict()
+		self.store = store
+
+	def replace(self, name, function, parameters=None):
+		"""Uses function (and optionally other parameter names) for the stage name"""
+		for number, (stage, old_function, old_parameters) in enumerate(self.stages):
+			if stage == name:
+				self.stages[number] = (name, function, parameters or old_parameters)
+				return
+		raise KeyError(name)
+
+	def run(self, hpgl, options, source=None):
+		"""
+		Replaces the routes of hpgl with the result of all stages.
+
+		:param options: stage parameters, e.g. from prepare_options()
+		:param source: key of the input routes, e.g. a route_key() computed
+		               once after loading (default: hash the routes now)
+		:return: key of the result
+		"""
+		key = source if source is not None else route_key(hpgl.routes)
+		steps = []
+		for name, function, parameters in self.stages:
+			values = tuple(options.get(parameter) for parameter in parameters)
+			if all(value in (None, False) for value in values):
+				continue
+			key = hashlib.sha1(repr((key, name, values)).encode()).hexdigest()
+			steps.append((key, name, function, values))
+
+		# continue after the last stage with a known result
+		routes = hpgl.routes
+		done = 0
+		for number in range(len(steps), 0, -1):
+			known = self._lookup(steps[number - 1][0])
+			if known is not None:
+				routes = known
+				done = number
+				break
+		for step_key, name, function, values in steps[done:]:
+			with self.timer.stage(name):
+				# copy, some HPGL operations modify paths in place
+				hpgl.routes = [list(path) for path in routes]
+				function(hpgl, *values)
+			routes = hpgl.routes
+			self._remember(step_key, routes)
+		if done < len(steps) and self.store is not None:
+			self.store.put(key, routes)
+		hpgl.routes = routes
+		return key
+
+	def _lookup(self, key):
+		if key in self.cache:
+			routes = self.cache.pop(key)
+		elif self.store is not None:
+			routes = self.store.get(key)
+			if routes is None:
+				return None
+		else:
+			return None
+		self._remember(key, routes)
+		return routes
+
+	def _remember(self, key, routes):
+		self.cache[key] = routes
+		while len(self.cache) > self.cache_size:
+			self.cache.popitem(last=False)
+
+
 HPGL_CMDS = {
 	re.compile(r"^PU(-?\d+),(-?\d+)$"): hpgl_goto,
 	re.compile(r"^PD(-?\d+),(-?\d+)$"): hpgl_cutto,
@@ -429,26 +671,20 @@ class HPGL:
 			self.move(0, y + deltaHPGL)
 			self.routes = original + self.routes
 
-	def getHPGL(self):
-		hpgl = HPGL_INIT
-		hpgl += HPGL_PEN_ABSOLUTE
+	def getPathCommands(self):
+		"""Returns the HPGL commands of each route as one string per route"""
+		commands = []
 		for route in self.routes:
-			first = True
 			route = tuple(map(lambda a: tuple(map(lambda b: int(round(b, 0)), a)), route))
 			goto = route[0]
 			route = ",".join(map(lambda a: "%d,%d" % a, route[1:]))
-			hpgl += HPGL_GOTO % goto
-			hpgl += HPGL_CUTTO_STR % route
-			continue
-			exit()
-			for x, y in route:
-				x = int(round(x, 0))
-				y = int(round(y, 0))
-				if first:
-					first = False
-					hpgl += HPGL_GOTO % (x, y)
-				else:
-					hpgl += HPGL_CUTTO % (x, y)
+			commands.append(HPGL_GOTO % goto + HPGL_CUTTO_STR % route)
+		return commands
+
+	def getHPGL(self):
+		hpgl = HPGL_INIT
+		hpgl += HPGL_PEN_ABSOLUTE
+		hpgl += "".join(self.getPathCommands())
 		hpgl += HPGL_GOTO % (0, 0)
 		hpgl += HPGL_SELECT_PEN % 0
 		hpgl += HPGL_SELECT_PEN % 0
@@ -498,62 +734,163 @@ class HPGL:
 				reverse = not reverse
 
 
+def batch_files(patterns):
+	"""Expands glob patterns (for shells that don't), keeps plain file names as given"""
+	files = []
+	for pattern in patterns:
+		if glob.has_magic(pattern):
+			files.extend(sorted(glob.glob(pattern)) or [pattern])
+		else:
+			files.append(pattern)
+	return files
+
+
+def batch_target(directory, fn, extension):
+	if directory is None:
+		return None
+	return os.path.join(directory, os.path.splitext(os.path.basename(fn))[0] + extension)
+
+
+def batch_work(files, options, output=None, preview=None):
+	"""
+	Jobs for prepare_file() and, per refused file, a failed result. A file
+	is refused if one of its targets is an input file or the target of an
+	earlier file in the batch (same basename in different directories).
+	"""
+	inputs = set(os.path.realpath(fn) for fn in files)
+	used = set()
+	work = []
+	refused = []
+	for fn in files:
+		targets = (batch_target(output, fn, ".hpgl"), batch_target(preview, fn, ".svg"))
+		error = None
+		for target in targets:
+			if target is None:
+				continue
+			real = os.path.realpath(target)
+			if real in inputs:
+				error = "{} would overwrite an input file".format(target)
+			elif real in used:
+				error = "{} is already written for another file".format(target)
+			if error is not None:
+				break
+		if error is not None:
+			refused.append({"file": fn, "error": error, "seconds": 0.0})
+			continue
+		used.update(os.path.realpath(target) for target in targets if target is not None)
+		work.append((fn, options) + targets)
+	return work, refused
+
+
+def prepare_file(job):
+	"""
+	Prepares one file in the batch mode (runs in a worker process).
+	job is (file name, arguments for prepare_options(), HPGL output, SVG output),
+	the outputs may be None. Errors are returned, not raised.
+	"""
+	fn, options, output, preview = job
+	result = {"file": fn, "error": None}
+	started = time.time()
+	try:
+		hpgl = HPGL(fn)
+		if not hpgl.getPaths():
+			raise ValueError("no paths")
+		Pipeline().run(hpgl, prepare_options(**options), source=fn)
+		data = hpgl.getHPGL()
+		if output is not None:
+			with open(output, "w") as f:
+				f.write(data)
+		if preview is not None:
+			hpgl.exportSVG(preview)
+		from hpgl_estimate import estimate
+		result["size"] = hpgl.getSize()
+		result["travel"], result["cut"] = hpgl.getLength()
+		result["eta"] = estimate(hpgl).total
+		result["bytes"] = len(data)
+	except Exception as e:
+		result["error"] = str(e) or type(e).__name__
+	result["seconds"] = time.time() - started
+	return result
+
+
+def print_batch(results):
+	from hpgl_estimate import format_duration
+	print("{:30} {:>15} {:>12} {:>12} {:>9} {:>8} {:>10}  {}".format(
+		"file", "size [mm]", "travel [mm]", "cut [mm]", "eta", "prep [s]", "bytes", "status"))
+	for result in results:
+		if result["error"] is not None:
+			print("{:30} {:>15} {:>12} {:>12} {:>9} {:8.2f} {:>10}  FAILED: {}".format(
+				result["file"], "", "", "", "", result["seconds"], "", result["error"]))
+			continue
+		print("{:30} {:>15} {:12.1f} {:12.1f} {:>9} {:8.2f} {:10d}  ok".format(
+			result["file"], "{:.0f} x {:.0f}".format(*result["size"]), result["travel"], result["cut"],
+			format_duration(result["eta"]), result["seconds"], result["bytes"]))
+
+
+def run_batch(files, options, output=None, preview=None, jobs=None):
+	"""
+	Prepares several files in a process pool, prints a summary table and
+	returns the number of failed files. output and preview are directories.
+	"""
+	for directory in (output, preview):
+		if directory is not None and not os.path.isdir(directory):
+			os.makedirs(directory)
+	work, refused = batch_work(files, options, output, preview)
+	if jobs == 1:
+		results = [prepare_file(job) for job in work]
+	else:
+		import multiprocessing
+		pool = multiprocessing.Pool(jobs)
+		try:
+			results = pool.map(prepare_file, work, chunksize=1)
+		finally:
+			pool.close()
+			pool.join()
+	# keep the order of the command line
+	order = dict((fn, number) for number, fn in enumerate(files))
+	results = sorted(results + refused, key=lambda result: order[result["file"]])
+	print_batch(results)
+	return sum(1 for result in results if result["error"] is not None)
+
+
 if __name__ == "__main__":
 	import argparse
+	import sys
 	parser = argparse.ArgumentParser("HPGL modification/optimization tool")
-	parser.add_argument("file", type=str, help="the HPGL-file to edit")
-	parser.add_argument("-p", "--preview", type=str, help="Generate SVG preview file", metavar="SVG")
-	parser.add_argument("-o", "--output", type=str, help="Output HPGL file", metavar="HPGL")
+	parser.add_argument("files", nargs="+", metavar="file", help="the HPGL-file to edit, several files or globs for a batch run")
+	parser.add_argument("-p", "--preview", type=str, help="Generate SVG preview file (directory in a batch run)", metavar="SVG")
+	parser.add_argument("-o", "--output", type=str, help="Output HPGL file (directory in a batch run)", metavar="HPGL")
 	parser.add_argument("-m", "--magic", action="store_true", help="Enable auto-optimize")
 	parser.add_argument("-w", "--width", metavar="WIDTH", type=int, help="Scale to width in mm")
 	parser.add_argument("--mirror", action="store_true", help="Mirror on X-axis for inverted cuts (T-Shirts etc.)")
 	parser.add_argument("--pen", action="store_true", help="Disable cut optimization for rotating knifes")
+	parser.add_argument("--timing", action="store_true", help="Print the time taken by each stage")
+	parser.add_argument("--profile", metavar="KINDS", help="Profile the stages: cprofile, memory or both (comma separated), default from HPGL_PROFILE")
+	parser.add_argument("-j", "--jobs", type=int, help="Worker processes in a batch run (default: number of CPUs)")
+	parser.add_argument("--batch", action="store_true", help="Batch run with summary table even for a single file")
 	args = parser.parse_args()
 
-	HPGLinput = HPGL(args.file)
-
-	# do optimize stuff:
-	blade_optimize = False
-	optimize = False
-	reroute = False
-	rotate180 = False
-	mirror = False
-	margin = 5
-
-	if args.mirror:
-		mirror = True
-
-	if args.magic:
-		blade_optimize = True
-		reroute = True
-		optimize = True
-		rotate180 = True
-
-	if args.width is not None:
-		HPGLinput.scaleToWidth(args.width)
-
-	if args.pen:
-		blade_optimize = False
-
-	if rotate180:
-		HPGLinput.mirrorX()
-		HPGLinput.mirrorY()
-
-	if mirror:
-		HPGLinput.mirrorX()
-
-	if optimize:
-		HPGLinput.optimize()
-		HPGLinput.fit()
+	files = batch_files(args.files)
+	if args.batch or len(files) > 1:
+		options = {"magic": args.magic, "width": args.width, "mirror": args.mirror, "pen": args.pen}
+		failed = run_batch(files, options, args.output, args.preview, args.jobs)
+		if failed:
+			print("{} of {} files failed".format(failed, len(files)))
+		sys.exit(1 if failed else 0)
+	args.file = files[0]
 
-	if blade_optimize:
-		HPGLinput.optimizeCut(0.25)
-		HPGLinput.bladeOffset(0.25)
+	timer = StageTimer(profile=args.profile)
+	with timer.stage("parse"):
+		HPGLinput = HPGL(args.file)
 
-	if reroute:
-		HPGLinput.rerouteXY()
+	pipeline = Pipeline(timer=timer)
+	pipeline.run(HPGLinput, prepare_options(args.magic, args.width, args.mirror, args.pen), source=args.file)
 
 	if args.preview is not None:
-		HPGLinput.exportSVG(args.preview)
+		with timer.stage("exportSVG"):
+			HPGLinput.exportSVG(args.preview)
 	if args.output is not None:
-		HPGLinput.exportHPGL(args.output)
+		with timer.stage("exportHPGL"):
+			HPGLinput.exportHPGL(args.output)
+	if args.timing or timer.kinds:
+		timer.summary()
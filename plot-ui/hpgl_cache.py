@@ -0,0 +1,96 @@
+# hpgl_cache.py
+"""
+Cache vorbereiteter Aufträge auf der Platte.
+
+Schlüssel sind die Hashes, die hpgl.Pipeline bildet: Ausgangspunkt ist
+file_key() über den Dateiinhalt, jeder Schritt hängt seinen Namen und
+seine Parameter an. Ein Eintrag gilt also genau für diese Datei mit genau
+diesen Optionen, geänderte Dateien bekommen automatisch neue Schlüssel.
+Gespeichert wird mit pickle, das Verzeichnis gehört dem Benutzer.
+"""
+import hashlib
+import os
+import pickle
+
+from hpgl_job import STATE_DIR
+
+CACHE_DIR = os.path.join(STATE_DIR, "cache")
+CACHE_BYTES = 512 * 1024 * 1024  # darüber werden die am längsten unbenutzten Einträge gelöscht
+CACHE_VERSION = 1  # erhöhen, wenn sich Parser oder ein Schritt ändern und alte Einträge ungültig werden
+
+
+def file_key(file):
+    """Schlüssel für den Inhalt einer HPGL-Datei."""
+    digest = hashlib.sha1(f"hpgl-cache-{CACHE_VERSION}:".encode())
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PreparedCache:
+    """
+    Schlüssel-Wert-Speicher für Pfade und andere Ergebnisse der Vorbereitung.
+    Kann mehreren Prozessen gleichzeitig dienen (GUI, Watcher, Spooler),
+    geschrieben wird über eine temporäre Datei und os.replace().
+
+    :param directory: Cache-Verzeichnis (Standard: ~/.schneidplotter/cache)
+    :param max_bytes: Höchstgröße aller Einträge zusammen
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, kind):
+        return os.path.join(self.directory, f"{key}.{kind}.pickle")
+
+    def get(self, key, kind="routes"):
+        """Gespeicherter Wert oder None."""
+        path = self._path(key, kind)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)  # für das Aufräumen als benutzt markieren
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None  # beschädigt oder von einer älteren Programmversion
+
+    def put(self, key, value, kind="routes"):
+        path = self._path(key, kind)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.prune()
+
+    def prune(self):
+        """Löscht die am längsten unbenutzten Einträge, bis max_bytes eingehalten ist."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pickle"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def cached(cache, key, kind, build):
+    """Wert aus dem Cache oder von build() berechnet und gespeichert; cache darf None sein."""
+    value = cache.get(key, kind) if cache is not None else None
+    if value is None:
+        value = build()
+        if cache is not None:
+            cache.put(key, value, kind)
+    return value
@@ -0,0 +1,202 @@
+# hpgl_connection.py
+"""Dauerhafte Verbindung zur Interface-Box, die über mehrere Aufträge bestehen bleibt."""
+import asyncio
+import socket
+import threading
+
+from hpgl_transport import CONNECT_TIMEOUT, TCPTransport, Transport
+
+KEEPALIVE_IDLE = 10  # Sekunden Ruhe, bevor die erste Keep-Alive-Probe geht
+KEEPALIVE_INTERVAL = 5  # Sekunden zwischen zwei Proben
+KEEPALIVE_COUNT = 3  # unbeantwortete Proben, nach denen die Gegenstelle als tot gilt
+BACKOFF_START = 0.5  # Sekunden bis zum ersten Wiederverbindungsversuch
+BACKOFF_MAX = 30.0
+
+
+def enable_keepalive(sock):
+    """Schaltet TCP-Keep-Alive mit kurzen Intervallen ein, soweit das System es erlaubt."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+    elif hasattr(socket, "SIO_KEEPALIVE_VALS"):  # Windows
+        sock.ioctl(socket.SIO_KEEPALIVE_VALS,
+                   (1, KEEPALIVE_IDLE * 1000, KEEPALIVE_INTERVAL * 1000))
+
+
+class SharedTransport(Transport):
+    """
+    Sicht eines einzelnen Auftrags auf die dauerhafte Verbindung.
+
+    open() wartet nur, bis die Verbindung steht, close() lässt sie offen.
+    """
+
+    def __init__(self, connection, connect_timeout=CONNECT_TIMEOUT):
+        self.connection = connection
+        self.connect_timeout = connect_timeout
+        self.loop = connection.loop
+        self.chunk_size = TCPTransport.chunk_size
+        self.tcp = None
+        self.replies = None
+
+    async def open(self):
+        if not self.connection.is_connected:
+            self.connection.retry.set()  # nicht erst den Backoff abwarten
+        self.tcp = await asyncio.wait_for(self.connection.connected(), self.connect_timeout)
+        self.replies = asyncio.Queue()
+        self.connection.listener = self.replies
+
+    async def write(self, data):
+        await self.tcp.write(data)
+
+    async def read(self):
+        return await self.replies.get()
+
+    async def close(self):
+        if self.connection.listener is self.replies:
+            self.connection.listener = None
+
+    def abort(self):
+        # Nach einem Abbruch ist der Zustand des Datenstroms unklar, also neu verbinden
+        self.connection.drop()
+
+    def unacknowledged(self):
+        return self.tcp.unacknowledged() if self.tcp is not None else 0
+
+    def __str__(self):
+        return str(self.tcp or self.connection)
+
+
+class PlotterConnection:
+    """
+    Hält eine TCP-Verbindung zur Interface-Box offen und baut sie nach einem
+    Abbruch mit wachsendem Abstand (Backoff) neu auf. Tote Gegenstellen
+    werden per TCP-Keep-Alive erkannt. Die Verbindung lebt in einer eigenen
+    Event-Loop in einem Hintergrund-Thread.
+
+    :param host: Hostname oder IP-Adresse der Interface-Box
+    :param port: Port des Interface-Programms
+    :param log_callback: Callback-Funktion für Ausgaben (aus dem Hintergrund-Thread)
+    """
+
+    def __init__(self, host, port, log_callback=None):
+        self.host = host
+        self.port = port
+        self.log = log_callback or print
+        self.tcp = None
+        self.listener = None
+        self.ready = None
+        self.wakeup = None
+        self.retry = None
+        self.running = True
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.ready = asyncio.Event()
+        self.wakeup = asyncio.Event()
+        self.retry = asyncio.Event()
+        self.loop.run_until_complete(self._maintain())
+
+    async def _maintain(self):
+        backoff = BACKOFF_START
+        failing = None  # Adresse, deren Fehlschlag schon gemeldet ist
+        while self.running:
+            tcp = TCPTransport(self.host, self.port)
+            try:
+                await tcp.open()
+            except (OSError, asyncio.TimeoutError) as e:
+                # Nur den ersten Fehlschlag melden, weitere Versuche laufen still
+                if failing != str(tcp):
+                    failing = str(tcp)
+                    self.log(f"Plotter connection to {tcp} failed ({str(e) or type(e).__name__}), "
+                             "retrying in the background")
+                await self._sleep(backoff)
+                backoff = min(backoff * 2, BACKOFF_MAX)
+                continue
+            enable_keepalive(tcp.writer.get_extra_info("socket"))
+            backoff = BACKOFF_START
+            failing = None
+            self.tcp = tcp
+            self.ready.set()
+            self.log(f"Connected to plotter at {tcp}")
+            await self._receive(tcp)
+            self.ready.clear()
+            self.tcp = None
+            await tcp.close()
+            if self.running:
+                self.log(f"Plotter connection to {tcp} lost, reconnecting")
+
+    async def _receive(self, tcp):
+        """Liest, bis die Verbindung endet, und reicht Antworten an den laufenden Auftrag."""
+        reading = asyncio.ensure_future(tcp.read())
+        waking = asyncio.ensure_future(self.wakeup.wait())
+        try:
+            while True:
+                done, _ = await asyncio.wait([reading, waking],
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if waking in done:
+                    self.wakeup.clear()
+                    return
+                data = reading.result()
+                if not data:
+                    return
+                if self.listener is not None:
+                    self.listener.put_nowait(data)
+                reading = asyncio.ensure_future(tcp.read())
+        finally:
+            reading.cancel()
+            waking.cancel()
+            if self.listener is not None:
+                self.listener.put_nowait(b"")
+
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self.retry.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        self.retry.clear()
+
+    async def connected(self):
+        """Wartet, bis die Verbindung steht, und liefert den TCPTransport."""
+        while True:
+            await self.ready.wait()
+            if self.tcp is not None:
+                return self.tcp
+
+    @property
+    def is_connected(self):
+        return self.tcp is not None
+
+    def transport(self):
+        """Transport für einen Auftrag über diese Verbindung."""
+        return SharedTransport(self)
+
+    def drop(self):
+        """Trennt die aktuelle Verbindung, sie wird sofort neu aufgebaut."""
+        self.loop.call_soon_threadsafe(self._drop)
+
+    def _drop(self):
+        if self.tcp is not None:
+            self.tcp.abort()
+            self.wakeup.set()
+        self.retry.set()
+
+    def configure(self, host, port):
+        """Wechselt zu einer anderen Adresse (z. B. nach Änderung im GUI)."""
+        if (host, port) == (self.host, self.port):
+            return
+        self.host = host
+        self.port = port
+        self.drop()
+
+    def close(self):
+        self.running = False
+        self.drop()
+        self.thread.join(2.0)
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
@@ -0,0 +1,164 @@
+# hpgl_estimate.py
+"""
+Abschätzung der Schneidedauer eines Auftrags.
+
+HPGL.getLength() liefert nur Weglängen. Wie lange der Plotter wirklich
+braucht, hängt außerdem von Beschleunigung, dem Abbremsen in Ecken, dem
+Heben und Senken des Messers und der Übertragungsrate ab. Das Modell hier
+plant jeden Linienzug wie eine einfache Bewegungssteuerung: Trapezprofil
+je Segment, Eckgeschwindigkeit abhängig vom Knickwinkel, vor jedem Pfad
+eine Leerfahrt aus dem Stand in den Stand.
+"""
+import math
+
+from hpgl import mm2hpgl
+
+UNITS_PER_MM = mm2hpgl(1)
+
+
+class MachineProfile:
+    """
+    Kenndaten des Plotters. Die Standardwerte entsprechen dem Simulator
+    (hpgl_simulator.py) und sind für den realen Plotter nachzumessen.
+
+    :param cut_speed: Geschwindigkeit mit abgesenktem Messer in mm/s
+    :param travel_speed: Geschwindigkeit bei Leerfahrten in mm/s
+    :param acceleration: Beschleunigung in mm/s²
+    :param corner_speed: Geschwindigkeit in einer Spitzkehre in mm/s, bei
+                         flacheren Knicken wird entsprechend weniger gebremst
+    :param pen_delay: Sekunden zum Anheben oder Absenken des Messers
+    :param baudrate: Baudrate der seriellen Verbindung zum Plotter,
+                     10 Bit pro Zeichen (0 = unbegrenzt)
+    """
+
+    def __init__(self, cut_speed=100.0, travel_speed=300.0, acceleration=1000.0,
+                 corner_speed=10.0, pen_delay=0.05, baudrate=9600):
+        self.cut_speed = cut_speed
+        self.travel_speed = travel_speed
+        self.acceleration = acceleration
+        self.corner_speed = corner_speed
+        self.pen_delay = pen_delay
+        self.baudrate = baudrate
+
+    def transfer_time(self, size):
+        """Sekunden für die Übertragung von size Bytes."""
+        return size * 10.0 / self.baudrate if self.baudrate else 0.0
+
+
+def segment_time(length, v_entry, v_exit, v_max, acceleration):
+    """
+    Dauer einer geraden Bewegung mit Trapezprofil: Beschleunigen von
+    v_entry, höchstens v_max fahren, Abbremsen auf v_exit. Die Ein- und
+    Austrittsgeschwindigkeiten müssen über length erreichbar sein.
+    """
+    if length <= 0:
+        return 0.0
+    peak = min(v_max, math.sqrt((2 * acceleration * length + v_entry ** 2 + v_exit ** 2) / 2))
+    accelerating = (peak ** 2 - v_entry ** 2) / (2 * acceleration)
+    braking = (peak ** 2 - v_exit ** 2) / (2 * acceleration)
+    cruising = max(length - accelerating - braking, 0.0)
+    return (peak - v_entry) / acceleration + (peak - v_exit) / acceleration + cruising / peak
+
+
+def path_time(path, machine):
+    """
+    Dauer eines Schnitts entlang path (HPGL-Einheiten) aus dem Stand in
+    den Stand, ohne Messer heben und senken.
+    """
+    if len(path) < 2:
+        return 0.0
+    a = machine.acceleration
+    v_max = machine.cut_speed
+    lengths = []
+    limits = [0.0]  # höchste Geschwindigkeit an jedem Punkt
+    last_dx = last_dy = None
+    for (x0, y0), (x1, y1) in zip(path, path[1:]):
+        dx = (x1 - x0) / UNITS_PER_MM
+        dy = (y1 - y0) / UNITS_PER_MM
+        length = math.hypot(dx, dy)
+        if length == 0:
+            continue
+        if last_dx is not None:
+            # cos des Knickwinkels: 1 geradeaus, -1 Spitzkehre
+            turn = (dx * last_dx + dy * last_dy) / (length * lengths[-1])
+            limits.append(machine.corner_speed + (v_max - machine.corner_speed) * (1 + turn) / 2)
+        lengths.append(length)
+        last_dx, last_dy = dx, dy
+    if not lengths:
+        return 0.0
+    limits.append(0.0)
+    # Rückwärts: rechtzeitig bremsen können, vorwärts: nur so schnell wie erreichbar
+    for i in range(len(lengths) - 1, -1, -1):
+        limits[i] = min(limits[i], math.sqrt(limits[i + 1] ** 2 + 2 * a * lengths[i]))
+    for i in range(len(lengths)):
+        limits[i + 1] = min(limits[i + 1], math.sqrt(limits[i] ** 2 + 2 * a * lengths[i]))
+    return sum(segment_time(length, limits[i], limits[i + 1], v_max, a)
+               for i, length in enumerate(lengths))
+
+
+def travel_time(start, stop, machine):
+    """Dauer einer Leerfahrt von start nach stop (HPGL-Einheiten), ohne Messer heben."""
+    length = math.hypot(stop[0] - start[0], stop[1] - start[1]) / UNITS_PER_MM
+    return segment_time(length, 0.0, 0.0, machine.travel_speed, machine.acceleration)
+
+
+class Estimate:
+    """
+    Geschätzte Dauer eines Auftrags.
+
+    path_times[i] umfasst die Leerfahrt zu Pfad i, Senken und Heben des
+    Messers und den Schnitt. Der Plotter puffert die Daten, Bewegung und
+    Übertragung laufen also parallel: je Pfad zählt das Langsamere.
+    """
+
+    def __init__(self, path_times, cut, travel, pen, transfer, home):
+        self.path_times = path_times
+        self.cut = cut
+        self.travel = travel
+        self.pen = pen
+        self.transfer = transfer
+        self.home = home  # Rückfahrt zum Nullpunkt am Ende
+        self.total = sum(path_times) + home
+
+    def remaining(self, completed):
+        """Restdauer, wenn die ersten completed Pfade fertig sind."""
+        return sum(self.path_times[completed:]) + self.home
+
+    def __str__(self):
+        return (f"{format_duration(self.total)} (cut {self.cut:.0f}s, travel {self.travel:.0f}s, "
+                f"pen {self.pen:.0f}s, transfer {self.transfer:.0f}s)")
+
+
+def estimate(hpgl, machine=None):
+    """
+    Schätzt die Dauer für die Pfade eines HPGL-Objekts in der Reihenfolge,
+    in der sie geschnitten werden.
+
+    :param hpgl: HPGL-Objekt, z. B. HPGLPlotter.hpgl_input nach configure()
+    :param machine: MachineProfile (Standard: MachineProfile())
+    """
+    machine = machine or MachineProfile()
+    path_times = []
+    cut = travel = pen = transfer = 0.0
+    last = (0, 0)
+    for path, command in zip(hpgl.getPaths(), hpgl.getPathCommands()):
+        moving = travel_time(last, path[0], machine)
+        cutting = path_time(path, machine)
+        sending = machine.transfer_time(len(command))
+        path_times.append(max(moving + 2 * machine.pen_delay + cutting, sending))
+        travel += moving
+        cut += cutting
+        pen += 2 * machine.pen_delay
+        transfer += sending
+        last = path[-1]
+    home = travel_time(last, (0, 0), machine)
+    return Estimate(path_times, cut, travel + home, pen, transfer, home)
+
+
+def format_duration(seconds):
+    """Dauer als m:ss bzw. h:mm:ss."""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,110 @@
+# hpgl_job.py
+"""Sendeaufträge mit Pfad-Offsets und Checkpoints zum Fortsetzen abgebrochener Schnitte."""
+import bisect
+import hashlib
+import json
+import os
+import time
+
+from hpgl import HPGL_INIT, HPGL_PEN_ABSOLUTE
+from hpgl_transport import TRAILER
+
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".schneidplotter")
+CHECKPOINT_DIR = os.path.join(STATE_DIR, "checkpoints")
+CHECKPOINT_INTERVAL = 1.0  # Sekunden zwischen zwei Schreibvorgängen der Checkpoint-Datei
+RESUME_HEADER = "PU;" + HPGL_PEN_ABSOLUTE  # Messer anheben, falls mitten im Pfad abgebrochen
+
+
+class Job:
+    """
+    Ein HPGL-Auftrag, zerlegt in Pfade.
+
+    ends[i] ist der Byte-Offset im gesendeten Datenstrom, an dem Pfad
+    first + i vollständig übertragen ist. Darüber lässt sich ein
+    Sende-Offset auf die Anzahl fertiger Pfade abbilden.
+
+    :param paths: HPGL-Befehle je Pfad, wie HPGL.getPathCommands() sie liefert
+    :param first: Index des ersten enthaltenen Pfads im ursprünglichen Auftrag
+    :param job_id: Kennung des ursprünglichen Auftrags (Standard: Hash der Daten)
+    """
+
+    def __init__(self, paths, first=0, job_id=None):
+        self.paths = paths
+        self.first = first
+        header = RESUME_HEADER if first else HPGL_INIT + HPGL_PEN_ABSOLUTE
+        offset = len(header.encode())
+        self.ends = []
+        for path in paths[first:]:
+            offset += len(path.encode())
+            self.ends.append(offset)
+        self.data = header + "".join(paths[first:]) + TRAILER.decode()
+        self.id = job_id or hashlib.sha1(self.data.encode()).hexdigest()
+
+    @classmethod
+    def from_hpgl(cls, hpgl):
+        return cls(hpgl.getPathCommands())
+
+    @property
+    def total(self):
+        """Anzahl Pfade des ursprünglichen Auftrags."""
+        return len(self.paths)
+
+    def completed(self, offset):
+        """Anzahl vollständig übertragener Pfade bis zum Byte-Offset offset."""
+        return self.first + bisect.bisect_right(self.ends, offset)
+
+    def resume(self, completed):
+        """Auftrag ab dem ersten noch nicht fertigen Pfad, mit Leerfahrt dorthin."""
+        return Job(self.paths, completed, self.id)
+
+
+class Checkpoint:
+    """
+    Speichert den Fortschritt eines Auftrags als JSON-Datei.
+
+    update() merkt sich den neuesten Stand und schreibt ihn höchstens alle
+    interval Sekunden auf die Platte, flush() schreibt sofort.
+    """
+
+    def __init__(self, job, directory=CHECKPOINT_DIR, interval=CHECKPOINT_INTERVAL):
+        self.job = job
+        self.path = os.path.join(directory, job.id + ".json")
+        self.interval = interval
+        self.completed = None
+        self.saved = None
+        self.last = None
+
+    def load(self):
+        """Anzahl fertiger Pfade laut gespeichertem Checkpoint, sonst 0."""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get("total") != self.job.total:
+            return 0
+        return state.get("completed", 0)
+
+    def update(self, completed):
+        self.completed = completed
+        now = time.monotonic()
+        if self.last is None or now - self.last >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.completed is None or self.completed == self.saved:
+            return
+        self.last = time.monotonic()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"job": self.job.id, "completed": self.completed,
+                       "total": self.job.total, "time": time.time()}, f)
+        os.replace(tmp, self.path)
+        self.saved = self.completed
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
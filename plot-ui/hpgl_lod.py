@@ -0,0 +1,74 @@
+# hpgl_lod.py
+"""
+Detailstufen (Level of Detail) für die Vorschau.
+
+Für jeden Pfad wird einmal eine Pyramide immer stärker ausgedünnter
+Fassungen berechnet. Beim Zeichnen wird je nach Maßstab nur noch die
+passende Stufe ausgewählt, ohne neu zu vereinfachen.
+"""
+import math
+
+MAX_LEVEL = 16  # Stufe 16 lässt Punkte unter 2**16 HPGL-Einheiten (1,6 m) Abstand weg
+
+
+def decimate(path, tolerance):
+    """
+    Lässt Punkte weg, die näher als tolerance am zuletzt behaltenen Punkt
+    liegen. Erster und letzter Punkt bleiben immer erhalten.
+    """
+    if len(path) <= 2:
+        return path
+    limit = tolerance * tolerance
+    last_x, last_y = path[0]
+    kept = [path[0]]
+    for point in path[1:-1]:
+        dx = point[0] - last_x
+        dy = point[1] - last_y
+        if dx * dx + dy * dy >= limit:
+            kept.append(point)
+            last_x, last_y = point
+    kept.append(path[-1])
+    return kept
+
+
+def pyramid(path, max_level=MAX_LEVEL):
+    """
+    Stufen eines Pfads: Stufe 0 ist der Pfad selbst, Stufe k entsteht aus
+    Stufe k - 1 mit Toleranz 2**k. Die Abweichung von Stufe k zum Original
+    bleibt so unter 2**(k + 1) Einheiten. Sobald nur noch Anfang und Ende
+    übrig sind, endet die Pyramide.
+    """
+    levels = [path]
+    for level in range(1, max_level + 1):
+        if len(levels[-1]) <= 2:
+            break
+        levels.append(decimate(levels[-1], 2 ** level))
+    return levels
+
+
+class PathPyramid:
+    """
+    Vorberechnete Detailstufen für alle Pfade eines Auftrags.
+
+    Die Berechnung dauert etwa so lange wie ein Durchlauf über alle Punkte
+    und sollte im Worker-Thread passieren, die Auswahl einer Stufe kostet
+    danach praktisch nichts.
+
+    :param paths: Pfade wie HPGL.getPaths() sie liefert
+    """
+
+    def __init__(self, paths, max_level=MAX_LEVEL):
+        self.source = paths
+        self.pyramids = [pyramid(path, max_level) for path in paths]
+
+    @staticmethod
+    def level(units_per_pixel):
+        """Gröbste Stufe, deren Abweichung unter einem Pixel bleibt."""
+        if units_per_pixel < 4:
+            return 0
+        return int(math.log2(units_per_pixel)) - 1
+
+    def paths(self, units_per_pixel):
+        """Alle Pfade in der zum Maßstab passenden Stufe."""
+        level = self.level(units_per_pixel)
+        return [levels[min(level, len(levels) - 1)] for levels in self.pyramids]
@@ -0,0 +1,105 @@
+# hpgl_monitor.py
+"""Erreichbarkeit der Interface-Box per TCP-Verbindungsprobe, ohne externe ping-Prozesse."""
+import asyncio
+import socket
+import threading
+import time
+
+MIN_INTERVAL = 2.0  # Sekunden zwischen Proben direkt nach einer Änderung
+MAX_INTERVAL = 15.0  # Sekunden zwischen Proben bei lange stabilem Zustand
+BACKOFF = 1.5  # Faktor, um den der Abstand bei unverändertem Zustand wächst
+PROBE_TIMEOUT = 1.0  # Sekunden für den Verbindungsaufbau
+DNS_TTL = 300.0  # Sekunden, die eine Namensauflösung zwischengespeichert wird
+
+
+class ReachabilityMonitor:
+    """
+    Prüft im Hintergrund, ob der Port der Interface-Box Verbindungen annimmt.
+
+    Statt eines ping-Prozesses genügt ein TCP-Verbindungsaufbau, der sofort
+    wieder geschlossen wird. Besteht eine PlotterConnection, gilt die Box
+    ohne Probe als erreichbar. Nur Zustandsänderungen werden als Tupel
+    (erreichbar, Meldung) in die Queue events gelegt, das GUI holt sie im
+    eigenen Thread ab.
+
+    :param host: Hostname oder IP-Adresse der Interface-Box
+    :param port: Port des Interface-Programms
+    :param events: queue.Queue für Zustandsänderungen
+    :param connection: Optionale PlotterConnection
+    """
+
+    def __init__(self, host, port, events, connection=None):
+        self.host = host
+        self.port = port
+        self.events = events
+        self.connection = connection
+        self.reachable = None
+        self.interval = MIN_INTERVAL
+        self.resolved = {}  # host -> (Adresse, gültig bis)
+        self.loop = asyncio.new_event_loop()
+        self.wakeup = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.wakeup = asyncio.Event()
+        self.loop.run_until_complete(self._monitor())
+
+    async def _resolve(self, host):
+        address, expires = self.resolved.get(host, (None, 0))
+        if address is None or time.monotonic() > expires:
+            infos = await self.loop.getaddrinfo(host, None, family=socket.AF_INET,
+                                                type=socket.SOCK_STREAM)
+            address = infos[0][4][0]
+            self.resolved[host] = (address, time.monotonic() + DNS_TTL)
+        return address
+
+    async def _probe(self, host, port):
+        if self.connection is not None and self.connection.is_connected:
+            return True, "Schneideplotter verbunden"
+        try:
+            address = await self._resolve(host)
+        except OSError:
+            return False, "Adresse unbekannt"
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port),
+                                               PROBE_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            self.resolved.pop(host, None)  # beim nächsten Mal neu auflösen
+            return False, "Schneideplotter nicht erreichbar"
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True, "Schneideplotter erreichbar"
+
+    async def _monitor(self):
+        while True:
+            reachable, message = await self._probe(self.host, self.port)
+            if reachable != self.reachable:
+                self.reachable = reachable
+                self.interval = MIN_INTERVAL
+                self.events.put((reachable, message))
+            else:
+                self.interval = min(self.interval * BACKOFF, MAX_INTERVAL)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    def configure(self, host, port):
+        """Neue Adresse übernehmen und sofort prüfen (aus jedem Thread)."""
+        if (host, port) == (self.host, self.port):
+            return
+        self.host = host
+        self.port = port
+        self.reachable = None
+        self.check()
+
+    def check(self):
+        """Sofort erneut prüfen, z. B. nach einem Fehler beim Senden."""
+        if self.wakeup is not None:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
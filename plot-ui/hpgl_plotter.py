@@ -1,18 +1,20 @@
+import hashlib
 import sys
-import socket
-from hpgl import HPGL
-try:
-    import serial
-except ImportError:
-    raise ImportError("You need to install pyserial. "
-                      "On Debian/Ubuntu try "
-                      "sudo apt-get install python-serial")
+from hpgl import HPGL, Pipeline, StageTimer, hpgl2mm, mm2hpgl, prepare_options
+from hpgl_cache import cached, file_key
+from hpgl_estimate import MachineProfile, estimate
+from hpgl_reroute import use_choose_route
+from hpgl_job import Job, Checkpoint
+from hpgl_transport import SerialTransport, TCPTransport, Transmission, format_progress, format_summary
 
 
 class HPGLPlotter:
     def __init__(self, file=None, port="/dev/ttyUSB0", magic=False, width=None, preview=False,
                  mirror=False, pen=False, tcp_host=None, tcp_port=None, 
-                 log_callback=None):
+                 log_callback=None, chunk_size=None, resume=False,
+                 flow_control=False, connection=None, progress_callback=None,
+                 path_callback=None, profile=None, machine=None,
+                 reroute_budget=None, cache=None):
         """
         Initialisiert den Plotter mit expliziten Argumenten.
 
@@ -26,23 +28,55 @@ class HPGLPlotter:
         :param tcp_host: Hostname oder IP-Adresse für TCP-Streaming
         :param tcp_port: Port für TCP-Streaming
         :param log_callback: Callback-Funktion für Ausgaben (z. B. GUI-Logging)
+        :param chunk_size: Bytes pro Schreibvorgang (Standard: passend zur Verbindung)
+        :param resume: Setzt einen abgebrochenen Auftrag am letzten Checkpoint fort
+        :param flow_control: Sendet nur so viel, wie in den Puffer des Plotters passt (ESC.B)
+        :param connection: Dauerhafte PlotterConnection, die statt einer neuen
+                           TCP-Verbindung je Auftrag genutzt wird
+        :param progress_callback: Erhält während des Sendens TransmitStats-Momentaufnahmen
+                                  (z. B. für einen Fortschrittsbalken)
+        :param path_callback: Erhält während des Sendens die Anzahl vollständig
+                              übertragener Pfade, sobald sie sich ändert
+        :param profile: Zusätzliche Messung der Vorbereitungsschritte, "cprofile",
+                        "memory" oder beides mit Komma getrennt (Standard: HPGL_PROFILE)
+        :param machine: MachineProfile für die Abschätzung der Schneidedauer
+        :param reroute_budget: Sekunden, in denen magic mehrere Strategien für die
+                               Reihenfolge der Pfade vergleicht (None: immer rerouteXY)
+        :param cache: PreparedCache für geparste und vorbereitete Pfade sowie die
+                      Abschätzung, auch über Programmstarts hinweg (z. B. vom Watcher befüllt)
         """
         self.file = file
         self.port = port
         self.magic = magic
-        self.width = width
+        self.width = width or None  # 0 heißt wie None Originalgröße
         self.preview = preview
         self.mirror = not mirror  # Standardmäßig spiegeln
         self.pen = pen
         self.tcp_host = tcp_host
         self.tcp_port = tcp_port
         self.hpgl_input = None
-        self.blade_optimize = False
-        self.optimize = False
-        self.reroute = False
-        self.rotate180 = False
+        self.base_routes = None
+        self.base_box = None
+        self.source = None  # file_key() der geladenen Datei
+        self.key = None  # Schlüssel des Ergebnisses der letzten Vorbereitung
+        self.reference = None
         self.margin = 5
         self.log_callback = log_callback or print
+        self.chunk_size = chunk_size
+        self.resume = resume
+        self.resumable = None  # fertige Pfade laut Checkpoint nach einer abgebrochenen Verbindung
+        self.flow_control = flow_control
+        self.connection = connection
+        self.progress_callback = progress_callback
+        self.path_callback = path_callback
+        self.transmission = None
+        self.timer = StageTimer(log=self.log, profile=profile)
+        self.machine = machine or MachineProfile()
+        self.estimate = None  # (Pfade, Estimate) der letzten Abschätzung
+        self.reroute_budget = reroute_budget
+        self.cache = cache
+        self.pipeline = Pipeline(timer=self.timer, store=cache)
+        use_choose_route(self.pipeline, self.machine, self.log)
 
     def log(self, message):
         """Schreibt eine Nachricht über die Log-Callback-Funktion."""
@@ -52,71 +86,123 @@ class HPGLPlotter:
     def load_hpgl_file(self):
         """Lädt die HPGL-Datei und initialisiert das HPGL-Objekt."""
         try:
-            self.hpgl_input = HPGL(self.file)
+            with self.timer.stage("parse"):
+                self.source = file_key(self.file)
+                self.hpgl_input = HPGL(None)
+                self.hpgl_input.routes = cached(self.cache, self.source, "routes",
+                                                lambda: HPGL(self.file).routes)
         except Exception as e:
             self.log("No/wrong/empty file given in argument.")
             raise e
+        # Die geparste Geometrie bleibt unverändert, configure() rechnet immer von hier aus
+        self.base_routes = self.hpgl_input.routes
+        self.base_box = self.hpgl_input.getBoundingBox()
+        self.reference = None
 
     def configure(self):
-        """Konfiguriert die Optimierungs- und Skalierungseinstellungen basierend auf den Attributen."""
-        if self.magic:
-            self.blade_optimize = True
-            self.reroute = True
-            self.optimize = True
-            self.rotate180 = True
+        """
+        Konfiguriert die Optimierungs- und Skalierungseinstellungen basierend auf den Attributen.
 
-        if self.width is not None:
-            self.hpgl_input.scaleToWidth(self.width)
+        Gerechnet wird immer von der beim Laden geparsten Geometrie aus, ein
+        erneuter Aufruf wendet also nichts doppelt an. Die Schritte und ihre
+        Parameter legt hpgl.Pipeline fest, deren Zwischenergebnisse
+        zwischengespeichert werden: Ändert sich ein Parameter, werden nur die
+        Schritte ab dem betroffenen neu berechnet.
+        """
+        options = prepare_options(self.magic, self.width, self.mirror, self.pen)
+        options["reroute_budget"] = self.reroute_budget if self.magic else None
+        self.hpgl_input.routes = self.base_routes
+        self.key = self.pipeline.run(self.hpgl_input, options, self.source)
+        self.timer.summary()
 
-        if self.pen:
-            self.blade_optimize = False
+        if not self.magic:
+            # Bezugswert für estimateDimensions()
+            self.reference = (self.mirror, self.width, sum(self.hpgl_input.getLength()))
 
-        if self.rotate180:
-            self.hpgl_input.mirrorX()
-            self.hpgl_input.mirrorY()
+    def transmit(self, transport):
+        """
+        Sendet die HPGL-Daten über den angegebenen Transport (blockierend).
+
+        Der Fortschritt wird pfadweise als Checkpoint gespeichert. Bricht die
+        Verbindung ab, setzt ein erneuter Aufruf mit resume=True nach dem
+        letzten vollständig übertragenen Pfad fort. Ob das möglich ist, steht
+        danach in resumable.
+        """
+        with self.timer.stage("emit"):
+            job = Job.from_hpgl(self.hpgl_input)
+        self.timer.summary()
+        self.resumable = None
+        checkpoint = Checkpoint(job)
+        if self.resume:
+            completed = checkpoint.load()
+            if completed:
+                self.log(f"Resuming after path {completed}/{job.total}")
+                job = job.resume(completed)
+            else:
+                self.log("No checkpoint found, sending the whole job.")
+        self.log(f"{len(job.data)} characters loaded")
+        self.log(f"Estimated time: {self.estimateTime()}")
+        self.log("Starting...")
+        self.transmission = Transmission(
+            transport, job.data, self.chunk_size,
+            on_progress=self._progress,
+            on_checkpoint=lambda offset: self._reached(job, checkpoint, offset),
+            flow_control=self.flow_control)
+        try:
+            stats = self.transmission.send()
+        except Exception:
+            checkpoint.flush()
+            self.resumable = checkpoint.load() or None  # auch von einem früheren Versuch
+            if self.resumable:
+                self.log(f"Checkpoint saved after path {self.resumable}/{job.total}, "
+                         "the job can be resumed.")
+            raise
+        finally:
+            self.transmission = None
+        if stats.cancelled:
+            checkpoint.flush()
+            completed = checkpoint.load()
+            self.log(f"Cancelled, checkpoint saved after path {completed}/{job.total}."
+                     if completed else "Cancelled before the first path was complete.")
+        else:
+            checkpoint.clear()
+            if self.path_callback:
+                self.path_callback(job.total)
+        self.log(format_summary(stats))
+        return stats
 
-        if self.mirror:
-            self.hpgl_input.mirrorX()
+    def _reached(self, job, checkpoint, offset):
+        """Bildet den bestätigten Byte-Offset auf fertige Pfade ab."""
+        completed = job.completed(offset)
+        if self.path_callback and completed != checkpoint.completed:
+            self.path_callback(completed)
+        checkpoint.update(completed)
 
-        if self.optimize:
-            self.hpgl_input.optimize()
-            self.hpgl_input.fit()
+    def _progress(self, stats):
+        self.log(format_progress(stats))
+        if self.progress_callback:
+            self.progress_callback(stats)
 
-        if self.blade_optimize:
-            self.hpgl_input.optimizeCut(0.25)
-            self.hpgl_input.bladeOffset(0.25)
+    def cancel(self):
+        """
+        Bricht eine laufende Übertragung ab (aus einem beliebigen Thread).
 
-        if self.reroute:
-            self.hpgl_input.rerouteXY()
+        :return: True, wenn eine Übertragung lief
+        """
+        transmission = self.transmission
+        if transmission is None:
+            return False
+        transmission.cancel()
+        return True
 
     def send_over_serial(self):
         """Sendet die HPGL-Daten über die serielle Schnittstelle."""
         self.log(f"Using serial port: {self.port}")
-        hpgl_data = self.hpgl_input.getHPGL()
-        self.log(f"{len(hpgl_data)} characters loaded")
-
         try:
-            port = serial.Serial(
-                port=self.port,
-                baudrate=9600,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                bytesize=serial.EIGHTBITS,
-                rtscts=True,
-                dsrdtr=True
-            )
-
-            commands = hpgl_data.split(";")
-            total = len(commands)
-
-            self.log("Starting...")
-            for i, command in enumerate(commands):
-                self.log(f"Sending... {((i + 1) * 100.0 / total):.1f}% done ({i + 1}/{total})")
-                if command:  # Ignoriere leere Befehle
-                    port.write(command.encode() + b";")
-            port.write("PU0,0;SP0;SP0;")
-            self.log("Serial communication finished.")
-        except serial.serialutil.SerialException:
+            stats = self.transmit(SerialTransport(self.port))
+            if not stats.cancelled:
+                self.log("Serial communication finished.")
+        except OSError:  # serial.SerialException ist ein OSError
             self.log(f"Failed to open serial port {self.port}.")
 
     def send_over_tcp(self):
@@ -126,36 +212,76 @@ class HPGLPlotter:
             return
 
         self.log(f"Sending data over TCP to {self.tcp_host}:{self.tcp_port}")
-        hpgl_data = self.hpgl_input.getHPGL()
-        self.log(f"{len(hpgl_data)} characters loaded")
-
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self.tcp_host, self.tcp_port))
-                # s.sendall(hpgl_data.encode())
-
-                commands = hpgl_data.split(";")
-                total = len(commands)
-                self.log("Starting...")
-                for i, command in enumerate(commands):
-                    self.log(f"Sending... {((i + 1) * 100.0 / total):.1f}% done ({i + 1}/{total})")
-                    if command:  # Ignoriere leere Befehle
-                        s.sendall((command + ";").encode())
-                        s.sendall("PU0,0;SP0;SP0;".encode())
+            if self.connection is not None:
+                self.connection.configure(self.tcp_host, self.tcp_port)
+                transport = self.connection.transport()
+            else:
+                transport = TCPTransport(self.tcp_host, self.tcp_port)
+            stats = self.transmit(transport)
+            if not stats.cancelled:
                 self.log("Data successfully sent over TCP.")
         except Exception as e:
-            self.log(f"Failed to send data over TCP: {e}")
+            self.log(f"Failed to send data over TCP: {str(e) or type(e).__name__}")
 
     def getDimensions(self):
         w, h = self.hpgl_input.getSize()
         movement = sum(self.hpgl_input.getLength())
         return w, h, movement
     
+    def estimateTime(self):
+        """
+        Geschätzte Schneidedauer der vorbereiteten Geometrie als Estimate.
+        Das Ergebnis wird behalten, bis configure() andere Pfade liefert.
+        """
+        routes = self.hpgl_input.routes
+        if self.estimate is None or self.estimate[0] is not routes:
+            machine = hashlib.sha1(repr(sorted(vars(self.machine).items())).encode()).hexdigest()
+            result = cached(self.cache if self.key else None, self.key, f"estimate-{machine[:12]}",
+                            lambda: estimate(self.hpgl_input, self.machine))
+            self.estimate = (routes, result)
+        return self.estimate[1]
+
+    def estimateDimensions(self, width, mirror):
+        """
+        Maße (Breite, Höhe, Weglänge in mm) für andere Breite und Spiegelung,
+        ohne die Geometrie neu zu berechnen. Skalieren und Spiegeln sind
+        linear: Breite und Höhe folgen aus dem Rahmen der geladenen Geometrie,
+        die Weglänge aus der letzten Berechnung mit gleicher Spiegelung.
+        Nicht so bestimmbare Werte (z. B. mit magic) sind None. Breite 0
+        heißt wie None Originalgröße.
+        """
+        width = width or None
+        if self.base_routes is None or self.magic:
+            return None, None, None
+        (min_x, min_y), (max_x, max_y) = self.base_box
+        if width is not None and max_x == min_x:
+            return None, None, None  # ohne Ausdehnung in X nicht auf eine Breite skalierbar
+        if width is None:
+            # Spiegeln verschiebt an den Nullpunkt, ohne Spiegeln bleibt der Abstand dazu
+            w = hpgl2mm(max_x - min_x if mirror else max_x)
+            h = hpgl2mm(max_y)
+        else:
+            factor = mm2hpgl(width) / (max_x - min_x)
+            w = hpgl2mm((max_x - min_x) * factor)
+            h = hpgl2mm((max_y - min_y) * factor)
+        length = None
+        if self.reference is not None:
+            ref_mirror, ref_width, ref_length = self.reference
+            if ref_mirror == mirror and ref_width == width:
+                length = ref_length
+            elif ref_mirror == mirror and ref_width and width:
+                length = ref_length * width / ref_width
+        return w, h, length
+
     def setMirror(self, mirror):
         self.mirror = mirror
         
     def setWidth(self, width):
-        self.width = width
+        self.width = width or None
+
+    def setResume(self, resume):
+        self.resume = resume
 
     def openFile(self, file):
         self.file = file
@@ -1,15 +1,29 @@
 # hpgl_preview.py
 import tkinter as tk
-import re
+import time
+
+CUT_COLOR = "black"
+TRAVEL_COLOR = "#66FF66"
+DONE_COLOR = "red"  # bereits geschnittene Pfade während des Sendens
 
 class HPGLPreview:
-    def __init__(self, canvas, file_path_label):
+    def __init__(self, canvas, file_path_label, log_callback=None):
         self.canvas = canvas
         self.file_path_label = file_path_label
-        self.last_x = None
-        self.last_y = None
-
-    def draw(self, hpgl_code):
+        self.log = log_callback or print
+        self.path_items = []  # Canvas-Element je Pfad, in Schneidereihenfolge
+        self.highlighted = 0
+
+    def draw(self, hpgl, pyramid=None):
+        """
+        Zeichnet die Pfade eines HPGL-Objekts so, wie sie geschnitten werden,
+        also nach Skalierung, Spiegelung und Optimierung durch den Plotter.
+
+        :param hpgl: HPGL-Objekt (z. B. HPGLPlotter.hpgl_input)
+        :param pyramid: Optionale PathPyramid zu den Pfaden von hpgl. Dann
+                        werden nur Punkte gezeichnet, die mindestens etwa
+                        ein Pixel auseinanderliegen.
+        """
         # Canvas-Größe ermitteln
         self.canvas.update_idletasks()  # Stellen sicher, dass die Canvas-Größe aktualisiert wurde
         canvas_width = self.canvas.winfo_width()
@@ -20,32 +34,19 @@ class HPGLPreview:
             print("Fehler: Canvas-Größe konnte nicht abgerufen werden.")
             return
 
-        # Variablen zur Berechnung der maximalen und minimalen Koordinaten
-        max_x, max_y, min_x, min_y = -float('inf'), -float('inf'), float('inf'), float('inf')
-        
-        # Regex, um die HPGL-Befehle zu extrahieren
-        pattern = r"(PU|PD)(\d+,\d+(?:,\d+,\d+)*)"
-        commands = re.findall(pattern, hpgl_code)
-
-        # Durch die HPGL-Befehle iterieren, um die maximalen und minimalen Koordinaten zu finden
-        for command in commands:
-            move_type, coords_str = command
-            coordinates = coords_str.split(',')
-            
-            # Bei `PU` und `PD` den Bewegungsbefehl erkennen
-            for i in range(0, len(coordinates), 2):
-                x = int(coordinates[i])
-                y = int(coordinates[i + 1])
-
-                # Maximal- und Minimalwerte anpassen
-                max_x = max(max_x, x)
-                max_y = max(max_y, y)
-                min_x = min(min_x, x)
-                min_y = min(min_y, y)
+        started = time.perf_counter()
+
+        # Canvas zurücksetzen
+        self.canvas.delete("all")
+        self.forget()
+        paths = hpgl.getPaths()
+        if not paths:
+            return
 
         # Berechne die Breite und Höhe des gesamten Objekts
-        obj_width = max_x - min_x
-        obj_height = max_y - min_y
+        (min_x, min_y), (max_x, max_y) = hpgl.getBoundingBox()
+        obj_width = max_x - min_x or 1
+        obj_height = max_y - min_y or 1
 
         # Skalierungsfaktor basierend auf der Canvas-Größe und der maximalen Dimension des Objekts
         scale_factor = min(canvas_width / obj_width, canvas_height / obj_height) * 0.9
@@ -54,36 +55,55 @@ class HPGLPreview:
         x_offset = (canvas_width - obj_width * scale_factor) / 2 - min_x * scale_factor
         y_offset = (canvas_height - obj_height * scale_factor) / 2 - min_y * scale_factor
 
-        # Canvas zurücksetzen
-        self.canvas.delete("all")
-
-        # Startkoordinaten anpassen
-        self.last_x, self.last_y = None, None
-
-        # Durch die HPGL-Befehle iterieren, um das Objekt zu zeichnen
-        for command in commands:
-            move_type, coords_str = command
-            coordinates = coords_str.split(',')
-            
-            # Bei `PU` und `PD` den Bewegungsbefehl erkennen
-            for i in range(0, len(coordinates), 2):
-                x = int(coordinates[i])
-                y = int(coordinates[i + 1])
-
-                # Skalierung anwenden und Y-Achse umkehren (Y wird jetzt von unten nach oben gezählt)
-                x = x * scale_factor + x_offset
-                y = canvas_height - (y * scale_factor + y_offset)
-
-                # Wählen der Farbe basierend auf dem Befehl: Helles Grün für PU, Schwarz für PD
-                line_color = "#66FF66" if move_type == "PU" else "black"
-
-                # Zeichnen der Linie mit entsprechender Farbe
-                if self.last_x is not None and self.last_y is not None:
-                    self.canvas.create_line(self.last_x, self.last_y, x, y, fill=line_color)
-
-                self.last_x, self.last_y = x, y
-
-        # Diese Zeile ist jetzt nicht mehr nötig, da der file_path nicht mehr gespeichert wird
-        # Selbst wenn du den Dateipfad im Label anzeigen möchtest, kannst du ihn an der Stelle übergeben, an der die Datei geladen wird
-        # self.file_path_label.config(text=f"Dateipfad: {file_path}")
-
+        # Passende Detailstufe wählen, Anfangs- und Endpunkte bleiben dabei gleich
+        level = 0
+        if pyramid is not None and pyramid.source is paths:
+            level = pyramid.level(1 / scale_factor)
+            paths = pyramid.paths(1 / scale_factor)
+
+        # Jeder Pfad ist ein Linienzug, dazwischen liegt je eine Leerfahrt
+        runs = []  # (Messer unten, [(x, y), ...])
+        last = None
+        for path in paths:
+            if last is not None:
+                runs.append((False, [last, path[0]]))
+            runs.append((True, path))
+            last = path[-1]
+
+        # Ein Canvas-Element je Linienzug statt je Segment
+        segments = 0
+        for pen_down, points in runs:
+            # Skalierung anwenden und Y-Achse umkehren (Y wird jetzt von unten nach oben gezählt)
+            coordinates = []
+            for x, y in points:
+                coordinates.append(x * scale_factor + x_offset)
+                coordinates.append(canvas_height - (y * scale_factor + y_offset))
+            segments += len(points) - 1
+
+            # Wählen der Farbe: Helles Grün für Leerfahrten (PU), Schwarz für Schnitte (PD)
+            line_color = CUT_COLOR if pen_down else TRAVEL_COLOR
+            item = self.canvas.create_line(coordinates, fill=line_color)
+            if pen_down:
+                self.path_items.append(item)
+
+        self.log(f"Preview: {segments} segments (detail level {level}) as {len(runs)} "
+                 f"canvas items in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def highlight(self, completed):
+        """
+        Markiert die ersten completed Pfade als geschnitten. Umgefärbt werden
+        nur die Elemente, deren Zustand sich seit dem letzten Aufruf geändert hat.
+        """
+        completed = min(completed, len(self.path_items))
+        if completed > self.highlighted:
+            for item in self.path_items[self.highlighted:completed]:
+                self.canvas.itemconfig(item, fill=DONE_COLOR)
+        else:
+            for item in self.path_items[completed:self.highlighted]:
+                self.canvas.itemconfig(item, fill=CUT_COLOR)
+        self.highlighted = completed
+
+    def forget(self):
+        """Vergisst die gezeichneten Elemente, z. B. wenn der Canvas anders genutzt wird."""
+        self.path_items = []
+        self.highlighted = 0
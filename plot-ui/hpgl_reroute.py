@@ -0,0 +1,168 @@
+# hpgl_reroute.py
+"""
+Auswahl der Reihenfolge, in der die Pfade geschnitten werden.
+
+rerouteXY und rerouteNearest ergeben je nach Auftrag und Parametern sehr
+unterschiedlich lange Leerfahrten. choose_route() probiert mehrere
+Strategien gleichzeitig in Worker-Prozessen aus, bewertet sie nach
+Leerfahrt oder geschätzter Dauer und übernimmt die beste, die innerhalb
+des Zeitbudgets fertig geworden ist.
+"""
+import threading
+import time
+
+from hpgl import HPGL, path_start_stop, path_center, path_median, path_mean
+from hpgl_estimate import estimate
+
+BUDGET = 10.0  # Sekunden für alle Strategien zusammen
+NEAREST_LIMIT = 3000  # rerouteNearest ist quadratisch in der Pfadzahl, darüber nur rerouteXY
+ROW_SIZES = (300, 600, 1200, 2400)  # HPGL-Einheiten, 600 ist der Standard von rerouteXY
+WEIGHTS = ((1, 2), (1, 1))  # (xweight, yweight) für rerouteNearest
+SCORES = ("travel", "time")
+
+ANCHORS = {
+    "start_stop": path_start_stop,
+    "center": path_center,
+    "median": path_median,
+    "mean": path_mean,
+}
+
+
+def candidates(path_count):
+    """
+    Strategien als (Name, Methode, Argumente). rerouteXY mit der
+    Standard-Zeilenhöhe steht vorne, damit sie auch bei knappem Budget
+    sicher fertig wird.
+    """
+    strategies = []
+    for anchor in ("start_stop", "center"):
+        for rowsize in ROW_SIZES:
+            strategies.append((f"rerouteXY rowsize={rowsize} anchor={anchor}", "rerouteXY",
+                               {"rowsize": rowsize, "anchor": anchor}))
+    strategies.sort(key=lambda strategy: strategy[2] != {"rowsize": 600, "anchor": "start_stop"})
+    if path_count <= NEAREST_LIMIT:
+        for anchor in ANCHORS:
+            for xweight, yweight in WEIGHTS:
+                strategies.append((f"rerouteNearest weights={xweight},{yweight} anchor={anchor}",
+                                   "rerouteNearest",
+                                   {"xweight": xweight, "yweight": yweight, "anchor": anchor}))
+    return strategies
+
+
+def score_route(hpgl, score="time", machine=None):
+    """Bewertung einer Reihenfolge, kleiner ist besser: Leerfahrt in mm oder Dauer in Sekunden."""
+    if score == "travel":
+        return hpgl.getLength()[0]
+    return estimate(hpgl, machine).total
+
+
+_routes = None  # Pfade des Auftrags im Worker-Prozess
+
+
+def _init_worker(routes):
+    global _routes
+    _routes = routes
+
+
+def _evaluate(method, options, score, machine):
+    """
+    Wendet eine Strategie auf eine Kopie der Pfadliste an. Die Strategien
+    sortieren nur um, zurück geht daher nur die neue Reihenfolge als Indizes.
+    """
+    hpgl = HPGL(None)
+    hpgl.routes = list(_routes)
+    options = dict(options)
+    options["pathfn"] = ANCHORS[options.pop("anchor")]
+    getattr(hpgl, method)(**options)
+    index = {id(path): number for number, path in enumerate(_routes)}
+    return [index[id(path)] for path in hpgl.routes], score_route(hpgl, score, machine)
+
+
+def _pool(workers, routes):
+    """
+    Worker-Prozesse per fork. fork übernimmt die Pfade ohne Pickle und
+    startet das aufrufende Programm nicht noch einmal; spawn und forkserver
+    würden das Hauptmodul erneut ausführen, bei plotUI.py also ein zweites
+    Fenster öffnen. Laufen weitere Threads (GUI mit Executor und
+    Verbindung), könnte das Kind an deren Locks hängen bleiben, dann wird
+    wie ohne fork im eigenen Prozess gerechnet.
+
+    :raises OSError: wenn keine Worker-Prozesse möglich sind
+    """
+    import multiprocessing  # erst hier, damit HPGLPlotter ohne Strategievergleich schnell startet
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise OSError("fork is not available")
+    if threading.active_count() > 1:
+        raise OSError(f"{threading.active_count() - 1} other threads running, fork is unsafe")
+    return multiprocessing.get_context("fork").Pool(workers, _init_worker, (routes,))
+
+
+def choose_route(hpgl, budget=BUDGET, score="time", machine=None, workers=None, log=None):
+    """
+    Ordnet die Pfade von hpgl nach der besten gefundenen Strategie um.
+
+    :param budget: Sekunden, nach denen noch laufende Strategien abgebrochen werden
+    :param score: "travel" (Leerfahrt in mm) oder "time" (geschätzte Dauer)
+    :param machine: MachineProfile für score="time"
+    :param workers: Anzahl Prozesse (Standard: Anzahl CPUs)
+    :param log: Callback-Funktion für Ausgaben
+    :return: Liste (Name, Bewertung) der fertig gewordenen Strategien, beste zuerst
+    """
+    if score not in SCORES:
+        raise ValueError(f"Unknown score {score!r}, expected one of {SCORES}")
+    log = log or print
+    started = time.monotonic()
+    routes = hpgl.getPaths()
+    strategies = candidates(len(routes))
+    results = []
+    try:
+        pool = _pool(workers, routes)
+    except (AssertionError, OSError) as e:
+        # z. B. in einem Daemon-Prozess, der keine Kinder starten darf, oder neben anderen Threads
+        log(f"Reroute: no worker processes ({e}), evaluating in this process")
+        _init_worker(routes)
+        for name, method, options in strategies:
+            if results and time.monotonic() - started > budget:
+                break
+            results.append((name,) + _evaluate(method, options, score, machine))
+    else:
+        try:
+            pending = [(name, pool.apply_async(_evaluate, (method, options, score, machine)))
+                       for name, method, options in strategies]
+            for name, result in pending:
+                result.wait(max(budget - (time.monotonic() - started), 0))
+                if not result.ready():
+                    continue
+                try:
+                    results.append((name,) + result.get())
+                except Exception as e:
+                    log(f"Reroute: {name} failed: {str(e) or type(e).__name__}")
+        finally:
+            pool.terminate()
+            pool.join()
+
+    if not results:
+        log(f"Reroute: no strategy finished within {budget:.1f}s, using rerouteXY")
+        hpgl.rerouteXY()
+        return []
+    results.sort(key=lambda result: result[2])
+    name, order, value = results[0]
+    hpgl.routes = [routes[number] for number in order]
+    unit = "mm travel" if score == "travel" else "s estimated"
+    log(f"Reroute: {name} best of {len(results)}/{len(strategies)} strategies "
+        f"({value:.1f} {unit}) in {time.monotonic() - started:.1f}s")
+    return [(name, value) for name, _, value in results]
+
+
+def use_choose_route(pipeline, machine=None, log=None):
+    """
+    Stellt den Schritt reroute einer hpgl.Pipeline auf choose_route() um,
+    sobald der zusätzliche Parameter reroute_budget gesetzt ist.
+    """
+    def reroute(hpgl, reroute, budget):
+        if budget:
+            choose_route(hpgl, budget, machine=machine, log=log)
+        else:
+            hpgl.rerouteXY()
+
+    pipeline.replace("reroute", reroute, ("reroute", "reroute_budget"))
@@ -0,0 +1,371 @@
+# hpgl_simulator.py
+"""
+Simulierter Schneideplotter zum Testen und Messen der Übertragung.
+
+Der Simulator nimmt HPGL über TCP (wie die Interface-Box) und/oder über
+ein Pseudo-Terminal (wie /dev/ttyUSB0) entgegen. Er liest nur so schnell,
+wie es die eingestellte Baudrate erlaubt, und nur, solange im
+Eingangspuffer Platz ist. Die Befehle werden mit einer aus den
+Verfahrwegen berechneten Dauer "abgearbeitet". ESC.B, ESC.L und ESC.O
+werden wie von einem HP-GL-Gerät beantwortet.
+"""
+import math
+import os
+import select
+import socket
+import threading
+import time
+
+UNITS_PER_MM = 1016 / 25.4
+
+
+class PlotterSimulator:
+    """
+    :param baudrate: Emulierte Baudrate (0 = unbegrenzt), 10 Bit pro Zeichen
+    :param buffer_size: Größe des Eingangspuffers in Bytes
+    :param cut_speed: Geschwindigkeit mit abgesenktem Messer in mm/s
+    :param travel_speed: Geschwindigkeit bei Leerfahrten in mm/s
+    :param pen_delay: Sekunden zum Anheben oder Absenken des Messers
+    :param time_scale: Faktor für die simulierte Bewegungszeit (0 = keine Wartezeit)
+    """
+
+    def __init__(self, baudrate=9600, buffer_size=1024, cut_speed=100.0,
+                 travel_speed=300.0, pen_delay=0.05, time_scale=1.0):
+        self.baudrate = baudrate
+        self.buffer_size = buffer_size
+        self.cut_speed = cut_speed
+        self.travel_speed = travel_speed
+        self.pen_delay = pen_delay
+        self.time_scale = time_scale
+        self.buffer = bytearray()
+        self.received = bytearray()
+        self.condition = threading.Condition()
+        self.running = False
+        self.busy = False
+        self.threads = []
+        self.sockets = []
+        self.connections = 0  # offene TCP-Verbindungen, bis zum EOF des Senders
+        self.pty = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Setzt Aufzeichnung und Zähler zurück, z. B. zwischen zwei Messungen."""
+        with self.condition:
+            self.received = bytearray()
+            self.position = (0, 0)
+            self.pen_down = False
+            self.commands = 0
+            self.queries = 0
+            self.travel = 0.0  # mm
+            self.cut = 0.0  # mm
+            self.motion_time = 0.0  # s, unskaliert
+            self.max_fill = 0
+            self.first_byte = None
+            self.last_command = None
+
+    # Empfang
+
+    def _handle_escapes(self, data, reply):
+        """Entfernt Gerätesteuer-Sequenzen aus data und beantwortet Abfragen."""
+        while b"\x1b." in data:
+            index = data.index(b"\x1b.")
+            query = data[index + 2:index + 3]
+            data = data[:index] + data[index + 3:]
+            self.queries += 1
+            if query == b"B":
+                value = self.buffer_size - len(self.buffer)
+            elif query == b"L":
+                value = self.buffer_size
+            elif query == b"O":
+                value = 8 if not self.buffer and not self.busy else 0
+            else:
+                continue
+            reply(b"%d\r" % value)
+        return data
+
+    def _receive(self, read, reply):
+        """Liest vom Link, solange Platz im Puffer ist, gedrosselt auf die Baudrate."""
+        pending = b""  # angefangene Escape-Sequenz vom Ende des letzten Lesevorgangs
+        while self.running:
+            with self.condition:
+                while self.running and len(self.buffer) >= self.buffer_size:
+                    self.condition.wait(0.1)
+                room = self.buffer_size - len(self.buffer)
+            data = read(room)
+            if data is None:
+                continue
+            if not data:
+                return
+            if self.baudrate:
+                time.sleep(len(data) * 10.0 / self.baudrate)
+            data = pending + data
+            tail = data.rfind(b"\x1b")
+            if tail >= 0 and len(data) - tail < 3:
+                data, pending = data[:tail], data[tail:]
+            else:
+                pending = b""
+            with self.condition:
+                data = self._handle_escapes(data, reply)
+                if data and self.first_byte is None:
+                    self.first_byte = time.monotonic()
+                self.buffer.extend(data)
+                self.received.extend(data)
+                self.max_fill = max(self.max_fill, len(self.buffer))
+                self.condition.notify_all()
+
+    # Abarbeitung
+
+    def _motion(self, command):
+        """Dauer eines Befehls in Sekunden, aus Verfahrweg und Messerwechseln."""
+        name = command[:2].upper()
+        if name not in ("PU", "PD"):
+            return 0.0
+        duration = 0.0
+        pen_down = name == "PD"
+        if pen_down != self.pen_down:
+            duration += self.pen_delay
+            self.pen_down = pen_down
+        values = [int(v) for v in command[2:].split(",") if v.strip()]
+        speed = self.cut_speed if pen_down else self.travel_speed
+        for x, y in zip(values[0::2], values[1::2]):
+            distance = math.hypot(x - self.position[0], y - self.position[1]) / UNITS_PER_MM
+            if pen_down:
+                self.cut += distance
+            else:
+                self.travel += distance
+            duration += distance / speed
+            self.position = (x, y)
+        return duration
+
+    def _execute(self):
+        while self.running:
+            with self.condition:
+                while self.running and b";" not in self.buffer:
+                    self.busy = False
+                    self.condition.wait(0.1)
+                if not self.running:
+                    return
+                index = self.buffer.index(b";")
+                command = self.buffer[:index].decode(errors="replace").strip()
+                del self.buffer[:index + 1]
+                self.busy = True
+                self.condition.notify_all()
+            try:
+                duration = self._motion(command)
+            except ValueError:
+                duration = 0.0  # unbekannte Parameter, wie ein echtes Gerät ignorieren
+            with self.condition:
+                self.commands += 1
+                self.motion_time += duration
+            if duration and self.time_scale:
+                time.sleep(duration * self.time_scale)
+            with self.condition:
+                self.last_command = time.monotonic()
+
+    def _thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self._thread(self._execute)
+
+    # Links
+
+    def start_tcp(self, host="127.0.0.1", port=12345):
+        """Öffnet einen TCP-Port wie die Interface-Box. Liefert (host, port)."""
+        self.start()
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen()
+        server.settimeout(0.2)
+        self.sockets.append(server)
+        self._thread(self._accept, server)
+        return server.getsockname()
+
+    def _accept(self, server):
+        while self.running:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            # Kleiner Empfangspuffer, damit sich ein voller Plotter beim Sender bemerkbar macht
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            conn.settimeout(0.2)
+            self.sockets.append(conn)
+            self._thread(self._serve_tcp, conn)
+
+    def _serve_tcp(self, conn):
+        def read(size):
+            try:
+                return conn.recv(size)
+            except socket.timeout:
+                return None
+            except OSError:
+                return b""
+
+        with self.condition:
+            self.connections += 1
+        try:
+            self._receive(read, conn.sendall)
+        finally:
+            conn.close()
+            with self.condition:
+                self.connections -= 1
+                self.condition.notify_all()
+
+    def start_pty(self):
+        """Öffnet ein Pseudo-Terminal wie eine serielle Schnittstelle. Liefert den Gerätepfad."""
+        import tty
+        self.start()
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        self.pty = (master, slave)
+        self._thread(self._serve_pty, master)
+        return os.ttyname(slave)
+
+    def _serve_pty(self, master):
+        def read(size):
+            ready, _, _ = select.select([master], [], [], 0.2)
+            if not ready:
+                return None
+            try:
+                return os.read(master, size)
+            except OSError:
+                return None  # Gegenseite (noch) nicht geöffnet
+
+        self._receive(read, lambda data: os.write(master, data))
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        for sock in self.sockets:
+            sock.close()
+        for thread in self.threads:
+            thread.join(1.0)
+        if self.pty:
+            for fd in self.pty:
+                os.close(fd)
+            self.pty = None
+
+    # Auswertung
+
+    def wait_idle(self, timeout=None, settle=0.3, size=None):
+        """
+        Wartet, bis alles abgearbeitet ist: Der Puffer ist leer und entweder
+        sind size Bytes angekommen, oder alle TCP-Verbindungen sind vom
+        Sender geschlossen und seit settle Sekunden kam nichts mehr an (beim
+        Pseudo-Terminal gibt es kein Ende der Verbindung). Eine Ruhepause
+        allein reicht bei TCP nicht: Nach einem vollen Empfangsfenster kann
+        die Zustellung des Rests über eine Sekunde stocken.
+
+        :param size: erwartete Anzahl Bytes ohne Gerätesteuer-Sequenzen
+        """
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        while deadline is None or time.monotonic() < deadline:
+            with self.condition:
+                idle = not self.buffer and not self.busy
+                complete = size is not None and len(self.received) >= size
+                closed = self.connections == 0
+                last = max(self.last_command or 0, self.first_byte or 0, started)
+            if idle and (complete or closed and time.monotonic() - last >= settle):
+                return True
+            time.sleep(0.02)
+        return False
+
+    def report(self):
+        """Kennzahlen der bisherigen Simulation."""
+        with self.condition:
+            active = None
+            if self.first_byte and self.last_command:
+                active = self.last_command - self.first_byte
+            return {
+                "bytes": len(self.received),
+                "commands": self.commands,
+                "queries": self.queries,
+                "travel_mm": round(self.travel, 1),
+                "cut_mm": round(self.cut, 1),
+                "motion_s": round(self.motion_time, 2),
+                "active_s": round(active, 2) if active is not None else None,
+                "max_fill": self.max_fill,
+            }
+
+
+def selftest(file, simulator, flow_modes=(False, True)):
+    """Sendet file über HPGLPlotter an den Simulator und vergleicht die Modi."""
+    from hpgl_plotter import HPGLPlotter
+    host, port = simulator.start_tcp("127.0.0.1", 0)
+    links = [("tcp", {"tcp_host": host, "tcp_port": port})]
+    try:
+        links.append(("serial", {"port": simulator.start_pty()}))
+    except (ImportError, OSError) as e:
+        print(f"Skipping serial link: {e}")
+    failed = False
+    for name, options in links:
+        for flow_control in flow_modes:
+            plotter = HPGLPlotter(file, log_callback=lambda message: None,
+                                  flow_control=flow_control, **options)
+            plotter.prepare()
+            expected = plotter.hpgl_input.getHPGL().encode()
+            simulator.reset_stats()
+            started = time.monotonic()
+            plotter.send()
+            sent = time.monotonic() - started
+            simulator.wait_idle(size=len(expected))
+            report = simulator.report()
+            done = (report["active_s"] or 0) + (simulator.first_byte or started) - started
+            ok = bytes(simulator.received) == expected
+            failed = failed or not ok
+            mode = "flow" if flow_control else "plain"
+            print(f"{name:6} {mode:5} {'ok' if ok else 'MISMATCH':8} "
+                  f"sender {sent:6.2f}s  device {done:6.2f}s  "
+                  f"{report['bytes'] / done if done else 0:8.0f} bytes/s  "
+                  f"max fill {report['max_fill']}  queries {report['queries']}")
+    return not failed
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser("HPGL plotter simulator")
+    parser.add_argument("--tcp", metavar="HOST:PORT", nargs="?", const="127.0.0.1:12345",
+                        help="Listen on TCP like the interface box (default 127.0.0.1:12345)")
+    parser.add_argument("--pty", action="store_true", help="Open a pseudo terminal like a serial port")
+    parser.add_argument("--baud", type=int, default=9600, help="Emulated baud rate, 0 for unlimited")
+    parser.add_argument("--buffer", type=int, default=1024, help="Input buffer size in bytes")
+    parser.add_argument("--cut-speed", type=float, default=100.0, help="Cutting speed in mm/s")
+    parser.add_argument("--travel-speed", type=float, default=300.0, help="Travel speed in mm/s")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Factor for simulated motion time, 0 to skip it")
+    parser.add_argument("--selftest", metavar="HPGL",
+                        help="Send the file through HPGLPlotter to the simulator and compare modes")
+    args = parser.parse_args()
+
+    simulator = PlotterSimulator(args.baud, args.buffer, args.cut_speed,
+                                 args.travel_speed, time_scale=args.time_scale)
+    if args.selftest:
+        try:
+            ok = selftest(args.selftest, simulator)
+        finally:
+            simulator.stop()
+        exit(0 if ok else 1)
+
+    if args.tcp:
+        host, port = args.tcp.rsplit(":", 1)
+        print("Listening on {}:{}".format(*simulator.start_tcp(host, int(port))))
+    if args.pty:
+        print(f"Serial device: {simulator.start_pty()}")
+    if not args.tcp and not args.pty:
+        parser.error("use --tcp and/or --pty")
+    try:
+        while True:
+            time.sleep(5)
+            print(simulator.report())
+    except KeyboardInterrupt:
+        simulator.stop()
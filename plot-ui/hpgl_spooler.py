@@ -0,0 +1,317 @@
+# hpgl_spooler.py
+"""
+Warteschlange für Schneideaufträge.
+
+Aufträge landen als JSON-Dateien im Spool-Verzeichnis und überstehen so
+auch einen Neustart. Der Spooler bereitet wartende Aufträge in einem
+Prozess-Pool vor (Laden, Optimieren), während der aktuelle Auftrag noch
+geschnitten wird, und sendet den nächsten, sobald der Plotter frei ist.
+"""
+import concurrent.futures
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from hpgl_job import STATE_DIR, Checkpoint, Job
+from hpgl_transport import SerialTransport, TCPTransport, Transmission, format_summary
+
+SPOOL_DIR = os.path.join(STATE_DIR, "spool")
+POLL_INTERVAL = 0.5  # Sekunden zwischen zwei Blicken ins Spool-Verzeichnis
+SEND_RETRIES = 3  # Fortsetzungsversuche nach einem Verbindungsabbruch mit Checkpoint
+RETRY_DELAY = 30.0  # Sekunden bis zum nächsten Versuch
+
+QUEUED = "queued"
+PREPARING = "preparing"
+READY = "ready"
+SENDING = "sending"
+DONE = "done"
+FAILED = "failed"
+WAITING = (QUEUED, PREPARING, READY)
+
+
+def prepare_job(file, options):
+    """Bereitet eine HPGL-Datei vor (läuft im Worker-Prozess). Liefert die Pfad-Befehle."""
+    from hpgl_cache import PreparedCache
+    from hpgl_plotter import HPGLPlotter
+    started = time.monotonic()
+    plotter = HPGLPlotter(file, log_callback=lambda message: None, cache=PreparedCache(), **options)
+    plotter.load_hpgl_file()
+    if not plotter.hpgl_input.getPaths():
+        raise ValueError("no paths")  # sonst würden nur Kopf und Schluss gesendet
+    plotter.configure()
+    return plotter.hpgl_input.getPathCommands(), time.monotonic() - started
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+class Spooler:
+    """
+    :param directory: Spool-Verzeichnis (Standard: ~/.schneidplotter/spool)
+    :param transport_factory: Funktion, die für jeden Auftrag einen neuen Transport liefert
+    :param workers: Anzahl paralleler Vorbereitungs-Prozesse
+    :param flow_control: Puffer-Flusskontrolle per ESC.B beim Senden
+    :param log_callback: Callback-Funktion für Ausgaben
+    """
+
+    def __init__(self, directory=SPOOL_DIR, transport_factory=None, workers=2,
+                 flow_control=False, log_callback=None):
+        self.directory = directory
+        self.transport_factory = transport_factory
+        self.workers = workers
+        self.flow_control = flow_control
+        self.log = log_callback or print
+        self.preparing = {}
+        self.lock = threading.Lock()
+        self.sender = None
+        self.running = False
+        os.makedirs(directory, exist_ok=True)
+
+    # Auftragsdateien
+
+    def _path(self, job_id, suffix=".json"):
+        return os.path.join(self.directory, job_id + suffix)
+
+    def load(self, job_id):
+        with open(self._path(job_id)) as f:
+            return json.load(f)
+
+    def save(self, job):
+        _write_json(self._path(job["id"]), job)
+
+    def update(self, job_id, **changes):
+        with self.lock:
+            job = self.load(job_id)
+            job.update(changes)
+            self.save(job)
+        return job
+
+    def jobs(self):
+        """Alle Aufträge in Einreichungsreihenfolge."""
+        jobs = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") and name != "status.json":
+                try:
+                    jobs.append(self.load(name[:-5]))
+                except (OSError, ValueError):
+                    pass  # wird gerade geschrieben
+        return sorted(jobs, key=lambda job: job["submitted"])
+
+    def submit(self, file, **options):
+        """
+        Reiht eine HPGL-Datei ein. Die Datei wird ins Spool-Verzeichnis
+        kopiert, spätere Änderungen am Original betreffen den Auftrag nicht.
+
+        :param options: Argumente für HPGLPlotter (magic, width, mirror, pen, reroute_budget)
+        :return: Kennung des Auftrags
+        """
+        job_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        shutil.copyfile(file, self._path(job_id, ".hpgl"))
+        self.save({"id": job_id, "name": os.path.basename(file), "options": options,
+                   "state": QUEUED, "submitted": time.time()})
+        return job_id
+
+    # Betrieb
+
+    def recover(self):
+        """Setzt nach einem Neustart unterbrochene Aufträge zurück."""
+        for job in self.jobs():
+            if job["state"] == PREPARING:
+                self.update(job["id"], state=QUEUED)
+            elif job["state"] == SENDING:
+                # Der Checkpoint sorgt dafür, dass nach dem letzten fertigen Pfad weitergeht
+                self.update(job["id"], state=READY, resume=True)
+
+    def retry(self, job_id):
+        """
+        Reiht einen fehlgeschlagenen Auftrag erneut ein. Wurde er schon
+        teilweise geschnitten, geht es nach dem letzten fertigen Pfad weiter.
+        """
+        job = self.load(job_id)
+        if job["state"] != FAILED:
+            raise ValueError(f"Job {job_id} is {job['state']}, only failed jobs can be retried")
+        prepared = os.path.exists(self._path(job_id, ".paths"))
+        self.update(job_id, state=READY if prepared else QUEUED, resume=True, attempts=0,
+                    retry_at=None, error=None)
+
+    def _prepared(self, job_id, future):
+        self.preparing.pop(job_id, None)
+        try:
+            paths, seconds = future.result()
+        except Exception as e:
+            self.update(job_id, state=FAILED, error=f"preparation failed: {e}")
+            self.log(f"Job {job_id}: preparation failed: {e}")
+            return
+        with open(self._path(job_id, ".paths"), "w") as f:
+            json.dump(paths, f)
+        self.update(job_id, state=READY, prepared=time.time(), prepare_s=round(seconds, 3))
+
+    def _send(self, job):
+        job_id = job["id"]
+        self.update(job_id, state=SENDING, started=time.time())
+        self.log(f"Job {job_id}: sending {job['name']}")
+        checkpoint = None
+        try:
+            with open(self._path(job_id, ".paths")) as f:
+                hpgl_job = Job(json.load(f))
+            checkpoint = Checkpoint(hpgl_job)
+            if job.get("resume"):
+                completed = checkpoint.load()
+                if completed:
+                    self.log(f"Job {job_id}: resuming after path {completed}/{hpgl_job.total}")
+                    hpgl_job = hpgl_job.resume(completed)
+            transmission = Transmission(
+                self.transport_factory(), hpgl_job.data, flow_control=self.flow_control,
+                on_checkpoint=lambda offset: checkpoint.update(hpgl_job.completed(offset)))
+            stats = transmission.send()
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            completed = 0
+            if checkpoint is not None:
+                checkpoint.flush()
+                completed = checkpoint.load()
+            attempts = job.get("attempts", 0) + 1
+            if completed and attempts <= SEND_RETRIES:
+                # Verbindung abgebrochen, nach dem letzten fertigen Pfad erneut versuchen
+                self.update(job_id, state=READY, resume=True, attempts=attempts,
+                            retry_at=time.time() + RETRY_DELAY, error=error)
+                self.log(f"Job {job_id}: failed after path {completed}: {error}, "
+                         f"resuming in {RETRY_DELAY:.0f}s ({attempts}/{SEND_RETRIES})")
+                return
+            self.update(job_id, state=FAILED, finished=time.time(), error=error,
+                        resume=bool(completed))
+            self.log(f"Job {job_id}: failed: {error}")
+            return
+        checkpoint.clear()
+        self.update(job_id, state=DONE, finished=time.time(), error=None,
+                    send_s=round(stats.elapsed, 3), bytes=stats.bytes)
+        self.log(f"Job {job_id}: {format_summary(stats)}")
+
+    def step(self, pool):
+        """Ein Durchlauf: neue Aufträge vorbereiten, nächsten fertigen Auftrag senden."""
+        jobs = self.jobs()
+        for job in jobs:
+            if job["state"] == QUEUED and job["id"] not in self.preparing:
+                self.update(job["id"], state=PREPARING)
+                future = pool.submit(prepare_job, self._path(job["id"], ".hpgl"), job["options"])
+                self.preparing[job["id"]] = future
+                future.add_done_callback(lambda f, job_id=job["id"]: self._prepared(job_id, f))
+        if self.sender is None or not self.sender.is_alive():
+            # Strikt in Einreichungsreihenfolge: der älteste wartende Auftrag ist als nächster dran
+            waiting = [job for job in jobs if job["state"] in WAITING]
+            if (waiting and waiting[0]["state"] == READY
+                    and time.time() >= (waiting[0].get("retry_at") or 0)):
+                self.sender = threading.Thread(target=self._send, args=(waiting[0],), daemon=True)
+                self.sender.start()
+        self.write_status()
+
+    def run(self):
+        self.running = True
+        self.recover()
+        with concurrent.futures.ProcessPoolExecutor(self.workers) as pool:
+            while self.running:
+                self.step(pool)
+                time.sleep(POLL_INTERVAL)
+
+    def stop(self):
+        self.running = False
+
+    # Kennzahlen
+
+    def status(self):
+        """Warteschlangenlänge, Wartezeiten und Zeiten je Auftrag."""
+        now = time.time()
+        jobs = []
+        for job in self.jobs():
+            end = job.get("started") or now
+            jobs.append({
+                "id": job["id"],
+                "name": job["name"],
+                "state": job["state"],
+                "wait_s": round(end - job["submitted"], 1),
+                "prepare_s": job.get("prepare_s"),
+                "send_s": job.get("send_s"),
+                "bytes": job.get("bytes"),
+                "error": job.get("error"),
+            })
+        return {
+            "updated": now,
+            "queue_depth": sum(1 for job in jobs if job["state"] in WAITING),
+            "sending": [job["id"] for job in jobs if job["state"] == SENDING],
+            "jobs": jobs,
+        }
+
+    def write_status(self):
+        _write_json(os.path.join(self.directory, "status.json"), self.status())
+
+
+def print_status(status):
+    print(f"queue depth: {status['queue_depth']}")
+    for job in status["jobs"]:
+        times = " ".join(f"{key}={job[key]}" for key in ("wait_s", "prepare_s", "send_s")
+                         if job[key] is not None)
+        print(f"{job['id']}  {job['state']:9} {job['name']:30} {times}"
+              + (f"  ({job['error']})" if job["error"] else ""))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser("HPGL job spooler")
+    parser.add_argument("--spool", default=SPOOL_DIR, help="Spool directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Prepare and send queued jobs")
+    run_parser.add_argument("-p", "--port", default="/dev/ttyUSB0", help="Serial port")
+    run_parser.add_argument("--tcp", metavar="HOST:PORT", help="Send over TCP instead of serial")
+    run_parser.add_argument("-j", "--workers", type=int, default=2, help="Preparation processes")
+    run_parser.add_argument("--flow-control", action="store_true",
+                            help="Query the plotter buffer (ESC.B) and only send what fits")
+
+    submit_parser = commands.add_parser("submit", help="Queue HPGL files")
+    submit_parser.add_argument("files", nargs="+", help="HPGL files")
+    submit_parser.add_argument("-m", "--magic", action="store_true", help="Enable auto-optimize")
+    submit_parser.add_argument("-w", "--width", type=int, help="Scale to width in mm")
+    submit_parser.add_argument("--mirror", action="store_true",
+                               help="Mirror on X-axis (as the GUI checkbox and hpgl_watch.py)")
+    submit_parser.add_argument("--pen", action="store_true",
+                               help="Disable cut optimization for rotating knifes")
+    submit_parser.add_argument("--reroute-budget", type=float, metavar="SECONDS",
+                               help="With -m, compare path order strategies for this long")
+
+    commands.add_parser("status", help="Show queue and job timings")
+
+    retry_parser = commands.add_parser("retry", help="Queue failed jobs again, resuming cut ones")
+    retry_parser.add_argument("ids", nargs="+", help="Job ids as shown by status")
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        spooler = Spooler(args.spool)
+        for file in args.files:
+            # HPGLPlotter spiegelt, wenn mirror nicht gesetzt ist, --mirror meint das wie im GUI umgekehrt
+            print(spooler.submit(file, magic=args.magic, width=args.width,
+                                 mirror=not args.mirror, pen=args.pen,
+                                 reroute_budget=args.reroute_budget))
+    elif args.command == "status":
+        print_status(Spooler(args.spool).status())
+    elif args.command == "retry":
+        spooler = Spooler(args.spool)
+        for job_id in args.ids:
+            spooler.retry(job_id)
+    else:
+        if args.tcp:
+            host, port = args.tcp.rsplit(":", 1)
+            factory = lambda: TCPTransport(host, int(port))
+        else:
+            factory = lambda: SerialTransport(args.port)
+        spooler = Spooler(args.spool, factory, args.workers, args.flow_control)
+        try:
+            spooler.run()
+        except KeyboardInterrupt:
+            spooler.stop()
@@ -0,0 +1,318 @@
+# hpgl_tiles.py
+"""
+Gekachelte Rastervorschau mit Zoom und Verschieben.
+
+Der Auftrag wird je Zoomstufe in Kacheln von TILE_SIZE Pixeln gerastert.
+Das Rastern läuft in einem Hintergrund-Thread, fertige Kacheln landen in
+einem LRU-Cache, sodass Verschieben und Zurückzoomen nur noch vorhandene
+Bilder auf dem Canvas platzieren. Mit Pillow wird über ImageDraw gezeichnet,
+sonst mit einem einfachen Linien-Raster in reinem Python.
+"""
+import collections
+import math
+import queue
+import threading
+import time
+import tkinter as tk
+
+from hpgl_lod import PathPyramid
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+TILE_SIZE = 256  # Pixel je Kachelkante
+CACHE_TILES = 128  # Kacheln im Cache, bei 256 Pixeln etwa 32 MB
+GRID = 64  # Zellen je Achse im räumlichen Index
+MAX_ZOOM = 12  # Zoomstufe 0 zeigt den ganzen Auftrag, jede Stufe verdoppelt
+POLL_MS = 30  # Abstand, in dem fertige Kacheln übernommen werden
+
+BACKGROUND = (255, 255, 255)
+CUT_COLOR = (0, 0, 0)
+TRAVEL_COLOR = (0x66, 0xFF, 0x66)
+
+
+def clip_line(x0, y0, x1, y1, size):
+    """Schneidet eine Strecke auf das Quadrat [0, size - 1] zu (Liang-Barsky), sonst None."""
+    dx = x1 - x0
+    dy = y1 - y0
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x0), (dx, size - 1 - x0), (-dy, y0), (dy, size - 1 - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return None
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return None
+            t1 = min(t1, t)
+    return x0 + t0 * dx, y0 + t0 * dy, x0 + t1 * dx, y0 + t1 * dy
+
+
+def raster_line(pixels, x0, y0, x1, y1, color):
+    """Zeichnet eine Strecke in ein RGB-Bytearray der Größe TILE_SIZE x TILE_SIZE."""
+    clipped = clip_line(x0, y0, x1, y1, TILE_SIZE)
+    if clipped is None:
+        return
+    x, y, x1, y1 = clipped
+    steps = int(max(abs(x1 - x), abs(y1 - y))) + 1
+    step_x = (x1 - x) / steps
+    step_y = (y1 - y) / steps
+    for _ in range(steps + 1):
+        index = (int(y + 0.5) * TILE_SIZE + int(x + 0.5)) * 3
+        pixels[index:index + 3] = color
+        x += step_x
+        y += step_y
+
+
+class TileRenderer:
+    """
+    Rastert Kacheln aus den Pfaden eines Auftrags. Liest nur und kann daher
+    aus dem Hintergrund-Thread benutzt werden.
+
+    Zoomstufe 0 bildet die längere Seite des Auftrags auf view_size Pixel ab.
+
+    :param hpgl: HPGL-Objekt
+    :param pyramid: PathPyramid zu den Pfaden (wird sonst hier berechnet)
+    :param view_size: Pixel, die der Auftrag in Zoomstufe 0 einnimmt
+    """
+
+    def __init__(self, hpgl, pyramid, view_size):
+        paths = hpgl.getPaths()
+        if pyramid is None or pyramid.source is not paths:
+            pyramid = PathPyramid(paths)
+        (self.min_x, self.min_y), (self.max_x, self.max_y) = hpgl.getBoundingBox()
+        self.extent = max(self.max_x - self.min_x, self.max_y - self.min_y) or 1
+        self.base_scale = view_size / self.extent
+
+        # Leerfahrten zuerst, damit die Schnitte darüber liegen
+        self.items = []  # (Farbe, Detailstufen)
+        for previous, path in zip(paths, paths[1:]):
+            self.items.append((TRAVEL_COLOR, [[previous[-1], path[0]]]))
+        self.items.extend((CUT_COLOR, levels) for levels in pyramid.pyramids)
+
+        # Räumlicher Index: Zelle -> Indizes der Elemente, deren Rahmen sie berührt
+        self.cell = self.extent / GRID
+        self.index = collections.defaultdict(list)
+        for number, (_, levels) in enumerate(self.items):
+            xs = [x for x, _ in levels[0]]
+            ys = [y for _, y in levels[0]]
+            for cx in range(self._cell(min(xs) - self.min_x), self._cell(max(xs) - self.min_x) + 1):
+                for cy in range(self._cell(self.max_y - max(ys)), self._cell(self.max_y - min(ys)) + 1):
+                    self.index[cx, cy].append(number)
+
+    def _cell(self, offset):
+        return min(max(int(offset / self.cell), 0), GRID - 1)
+
+    def scale(self, zoom):
+        return self.base_scale * 2 ** zoom
+
+    def tiles(self, zoom):
+        """Anzahl Kacheln je Achse in dieser Zoomstufe."""
+        return math.ceil(self.extent * self.scale(zoom) / TILE_SIZE)
+
+    def render(self, zoom, tx, ty):
+        """Rastert eine Kachel und liefert sie als PPM-Daten."""
+        scale = self.scale(zoom)
+        left = tx * TILE_SIZE
+        top = ty * TILE_SIZE
+        # Weltausschnitt der Kachel, X von links, Y von oben (Y-Achse umgekehrt)
+        numbers = set()
+        for cx in range(self._cell(left / scale), self._cell((left + TILE_SIZE) / scale) + 1):
+            for cy in range(self._cell(top / scale), self._cell((top + TILE_SIZE) / scale) + 1):
+                numbers.update(self.index.get((cx, cy), ()))
+        level = PathPyramid.level(1 / scale)
+
+        if Image is not None:
+            image = Image.new("RGB", (TILE_SIZE, TILE_SIZE), BACKGROUND)
+            draw = ImageDraw.Draw(image)
+        else:
+            pixels = bytearray(bytes(BACKGROUND) * TILE_SIZE * TILE_SIZE)
+        for number in sorted(numbers):
+            color, levels = self.items[number]
+            points = [((x - self.min_x) * scale - left, (self.max_y - y) * scale - top)
+                      for x, y in levels[min(level, len(levels) - 1)]]
+            if Image is not None:
+                draw.line(points, fill=color)
+            else:
+                color = bytes(color)
+                for (x0, y0), (x1, y1) in zip(points, points[1:]):
+                    raster_line(pixels, x0, y0, x1, y1, color)
+        data = image.tobytes() if Image is not None else bytes(pixels)
+        return b"P6 %d %d 255\n" % (TILE_SIZE, TILE_SIZE) + data
+
+
+class TiledPreview:
+    """
+    Rastervorschau auf einem Canvas: Mausrad zoomt um den Mauszeiger,
+    Ziehen mit der linken Maustaste verschiebt.
+
+    :param canvas: tk.Canvas, der mit HPGLPreview geteilt werden kann
+    :param log_callback: Callback-Funktion für Ausgaben
+    :param cache_tiles: Anzahl Kacheln, die im LRU-Cache bleiben
+    """
+
+    def __init__(self, canvas, log_callback=None, cache_tiles=CACHE_TILES):
+        self.canvas = canvas
+        self.log = log_callback or print
+        self.cache_tiles = cache_tiles
+        self.cache = collections.OrderedDict()  # (Generation, Zoom, x, y) -> PhotoImage
+        self.renderer = None
+        self.generation = 0
+        self.zoom = 0
+        self.offset = (0, 0)  # Pixel der Zoomstufe in der linken oberen Canvas-Ecke
+        self.active = False
+        self.pending = set()
+        self.requests = queue.LifoQueue()  # neueste Anfragen zuerst, das ist die aktuelle Ansicht
+        self.results = queue.Queue()
+        self.rendered = 0
+        self.render_time = 0.0
+        self.drag = None
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+        canvas.bind("<ButtonPress-1>", self._start_drag, add="+")
+        canvas.bind("<B1-Motion>", self._drag, add="+")
+        canvas.bind("<MouseWheel>", self._wheel, add="+")
+        canvas.bind("<Button-4>", self._wheel, add="+")
+        canvas.bind("<Button-5>", self._wheel, add="+")
+
+    def show(self, hpgl, pyramid=None):
+        """Zeigt einen neuen Auftrag, der Index wird im Hintergrund aufgebaut."""
+        self.canvas.update_idletasks()
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        self.generation += 1
+        self.renderer = None
+        self.pending.clear()
+        self.cache.clear()
+        self.canvas.delete("all")
+        if not hpgl.getPaths():
+            return
+        if not self.active:
+            self.active = True
+            self.canvas.after(POLL_MS, self._poll)
+        view_size = min(width, height) * 0.9
+        self.zoom = 0
+        self.offset = (-(width - view_size) / 2, -(height - view_size) / 2)
+        self.requests.put((self.generation, "load", (hpgl, pyramid, view_size)))
+
+    def hide(self):
+        """Beendet die Rasteransicht, z. B. beim Wechsel zur Vektor-Vorschau."""
+        self.active = False
+        self.generation += 1
+        self.renderer = None
+        self.pending.clear()
+        self.cache.clear()
+        self.canvas.delete("tile")
+
+    # Hintergrund-Thread
+
+    def _work(self):
+        while True:
+            generation, kind, payload = self.requests.get()
+            if generation != self.generation or (kind == "tile" and payload[0] != self.zoom):
+                continue  # veraltet: neuer Auftrag oder andere Zoomstufe
+            started = time.perf_counter()
+            try:
+                if kind == "load":
+                    result = TileRenderer(*payload)
+                else:
+                    result = self.renderer.render(*payload)
+            except Exception as e:
+                result = e
+            self.results.put((generation, kind, payload, result,
+                              time.perf_counter() - started))
+
+    # GUI-Thread
+
+    def _poll(self):
+        if not self.active:
+            return
+        changed = False
+        try:
+            while True:
+                generation, kind, payload, result, seconds = self.results.get_nowait()
+                if generation != self.generation:
+                    continue
+                if isinstance(result, Exception):
+                    self.log(f"Tiles: rendering failed: {result}")
+                    continue
+                if kind == "load":
+                    self.renderer = result
+                    self.log(f"Tiles: index of {len(result.items)} items built in {seconds:.2f}s")
+                else:
+                    key = (generation,) + payload
+                    self.pending.discard(key)
+                    self.cache[key] = tk.PhotoImage(data=result, format="PPM")
+                    self.rendered += 1
+                    self.render_time += seconds
+                changed = True
+        except queue.Empty:
+            pass
+        if changed:
+            self.refresh()
+            if not self.pending and self.rendered:
+                backend = "Pillow" if Image is not None else "pure Python"
+                self.log(f"Tiles: {self.rendered} rendered at zoom {self.zoom} in "
+                         f"{self.render_time * 1000 / self.rendered:.0f} ms each ({backend})")
+                self.rendered = 0
+                self.render_time = 0.0
+        self.canvas.after(POLL_MS, self._poll)
+
+    def refresh(self):
+        """Platziert alle sichtbaren Kacheln und fordert fehlende an."""
+        if not self.active or self.renderer is None:
+            return
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        count = self.renderer.tiles(self.zoom)
+        ox, oy = self.offset
+        self.canvas.delete("tile")
+        for ty in range(max(int(oy // TILE_SIZE), 0), min(int((oy + height) // TILE_SIZE) + 1, count)):
+            for tx in range(max(int(ox // TILE_SIZE), 0), min(int((ox + width) // TILE_SIZE) + 1, count)):
+                key = (self.generation, self.zoom, tx, ty)
+                image = self.cache.get(key)
+                if image is not None:
+                    self.cache.move_to_end(key)
+                    self.canvas.create_image(tx * TILE_SIZE - ox, ty * TILE_SIZE - oy,
+                                             image=image, anchor="nw", tags="tile")
+                elif key not in self.pending:
+                    self.pending.add(key)
+                    self.requests.put((self.generation, "tile", key[1:]))
+        # Am längsten unbenutzte Kacheln verwerfen, sichtbare stehen am Ende
+        while len(self.cache) > self.cache_tiles:
+            self.cache.popitem(last=False)
+
+    def _start_drag(self, event):
+        self.drag = (event.x, event.y)
+
+    def _drag(self, event):
+        if not self.active or self.drag is None:
+            return
+        dx = event.x - self.drag[0]
+        dy = event.y - self.drag[1]
+        self.drag = (event.x, event.y)
+        self.offset = (self.offset[0] - dx, self.offset[1] - dy)
+        self.canvas.move("tile", dx, dy)
+        self.refresh()
+
+    def _wheel(self, event):
+        if not self.active or self.renderer is None:
+            return
+        step = 1 if event.num == 4 or event.delta > 0 else -1
+        zoom = min(max(self.zoom + step, 0), MAX_ZOOM)
+        if zoom == self.zoom:
+            return
+        # Der Punkt unter dem Mauszeiger bleibt stehen
+        factor = 2 ** (zoom - self.zoom)
+        self.offset = ((self.offset[0] + event.x) * factor - event.x,
+                       (self.offset[1] + event.y) * factor - event.y)
+        self.zoom = zoom
+        self.pending.clear()  # Anfragen der alten Stufe dürfen liegen bleiben
+        self.refresh()
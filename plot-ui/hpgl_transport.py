@@ -0,0 +1,525 @@
+# hpgl_transport.py
+"""Asynchrone, gepufferte Übertragung von HPGL-Daten an den Plotter."""
+import asyncio
+import concurrent.futures
+import copy
+import socket
+import struct
+import sys
+import time
+
+serial = None  # pyserial, erst beim ersten SerialTransport geladen (siehe _load_serial)
+
+if sys.platform.startswith("linux"):
+    import fcntl
+    import termios
+else:  # TIOCOUTQ auf Sockets gibt es nur unter Linux, z. B. macOS meldet ENOTTY
+    fcntl = None
+
+TRAILER = b"PU0,0;SP0;SP0;"
+CHUNK_SIZE = 512  # Bytes pro Schreibvorgang, etwa die Puffergröße des Plotters
+TCP_CHUNK_SIZE = 8192  # Bytes pro Schreibvorgang bei TCP-Übertragung
+PROGRESS_INTERVAL = 1.0  # Sekunden zwischen zwei Fortschrittsmeldungen
+ACK_WAIT = 0.2  # Sekunden, die nach dem Senden noch auf Antworten gewartet wird
+CONNECT_TIMEOUT = 10.0  # Sekunden für den Verbindungsaufbau
+WRITE_TIMEOUT = 60.0  # Sekunden, die ein Block maximal auf den Plotter warten darf
+
+# HP-GL Gerätesteuerung, die Antworten kommen als Dezimalzahl mit CR
+ESC_BUFFER_SPACE = b"\x1b.B"  # freier Platz im Eingangspuffer
+ESC_BUFFER_SIZE = b"\x1b.L"  # Größe des Eingangspuffers
+ESC_EXTENDED_STATUS = b"\x1b.O"  # erweiterter Status
+STATUS_BUFFER_EMPTY = 8  # Bit 3 im erweiterten Status
+BUFFER_RESERVE = 16  # Bytes, die im Gerätepuffer immer frei bleiben
+BUFFER_POLL = 0.05  # Sekunden zwischen zwei Abfragen bei vollem Puffer
+QUERY_TIMEOUT = 5.0  # Sekunden, die auf eine Antwort des Plotters gewartet wird
+
+
+def split_commands(hpgl_data):
+    """Zerlegt HPGL-Text in einzelne Befehle (als Bytes, jeweils mit ';')."""
+    return [command.encode() + b";" for command in hpgl_data.split(";") if command]
+
+
+def coalesce(commands, chunk_size=CHUNK_SIZE):
+    """
+    Fasst Befehle zu Blöcken von höchstens chunk_size Bytes zusammen.
+
+    Befehle werden nie zerteilt, ein einzelner zu langer Befehl wird als
+    eigener Block gesendet. Liefert Tupel (Block, Anzahl Befehle im Block).
+    """
+    block = []
+    size = 0
+    for command in commands:
+        if block and size + len(command) > chunk_size:
+            yield b"".join(block), len(block)
+            block = []
+            size = 0
+        block.append(command)
+        size += len(command)
+    if block:
+        yield b"".join(block), len(block)
+
+
+def job_commands(hpgl_data, trailer=TRAILER):
+    """Befehlsliste eines Auftrags, der Abschluss wird nur angehängt, falls er fehlt."""
+    commands = split_commands(hpgl_data)
+    if trailer and not b"".join(commands[-3:]).endswith(trailer):
+        commands.extend(split_commands(trailer.decode()))
+    return commands
+
+
+class TransmitStats:
+    """Zähler und Zeitmessung einer Übertragung."""
+
+    def __init__(self, total_commands, total_bytes):
+        self.total_commands = total_commands
+        self.total_bytes = total_bytes
+        self.commands = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.finished = None
+        self.cancelled = False
+        self.connect_latency = None  # Sekunden für den Verbindungsaufbau
+        self.ack_latency = None  # Sekunden bis zur ersten Antwort der Gegenstelle
+        self.ack_bytes = 0
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def percent(self):
+        if not self.total_bytes:
+            return 100.0
+        return self.bytes * 100.0 / self.total_bytes
+
+    @property
+    def rate(self):
+        """Erreichter Durchsatz in Bytes pro Sekunde."""
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+
+class Progress:
+    """Leitet Fortschrittsmeldungen höchstens alle interval Sekunden weiter."""
+
+    def __init__(self, callback, interval=PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self.last = None
+        self.reported = None
+
+    def update(self, stats, force=False):
+        now = time.monotonic()
+        if stats.bytes == self.reported:
+            return
+        if force or self.last is None or now - self.last >= self.interval:
+            self.last = now
+            self.reported = stats.bytes
+            self.callback(stats)
+
+
+def format_progress(stats):
+    return (f"Sending... {stats.percent:.1f}% done "
+            f"({stats.commands}/{stats.total_commands})")
+
+
+def format_summary(stats):
+    summary = (f"{stats.bytes} bytes sent in {stats.elapsed:.1f}s "
+               f"({stats.rate:.0f} bytes/s)")
+    if stats.connect_latency is not None:
+        summary += f", connect {stats.connect_latency * 1000:.0f}ms"
+    if stats.ack_latency is not None:
+        summary += (f", first reply after {stats.ack_latency * 1000:.0f}ms"
+                    f" ({stats.ack_bytes} bytes received)")
+    if stats.cancelled:
+        summary += ", cancelled"
+    return summary
+
+
+class Transport:
+    """
+    Basisklasse für asynchrone Verbindungen zum Plotter.
+
+    write() kehrt erst zurück, wenn die Gegenstelle wieder Daten annimmt,
+    ein voller Gerätepuffer bremst die Übertragung also automatisch.
+    """
+    chunk_size = CHUNK_SIZE
+    loop = None  # Event-Loop, an die der Transport gebunden ist (None = beliebig)
+
+    async def open(self):
+        raise NotImplementedError
+
+    async def write(self, data):
+        raise NotImplementedError
+
+    async def read(self):
+        """Liefert empfangene Bytes, b"" sobald die Verbindung geschlossen ist."""
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+    def abort(self):
+        """Bricht laufende Schreibvorgänge ab (wird beim Abbrechen aufgerufen)."""
+
+    def unacknowledged(self):
+        """Geschriebene Bytes, deren Ankunft bei der Gegenstelle noch nicht bestätigt ist."""
+        return 0
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class TCPTransport(Transport):
+    """TCP-Verbindung zur Interface-Box des Schneideplotters."""
+    chunk_size = TCP_CHUNK_SIZE
+
+    def __init__(self, host, port, connect_timeout=CONNECT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.connect_timeout)
+        sock = self.writer.get_extra_info("socket")
+        # Die Blöcke sind bereits gebündelt, Nagle würde nur den letzten verzögern
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * self.chunk_size)
+        self.writer.transport.set_write_buffer_limits(high=2 * self.chunk_size)
+
+    async def write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    async def read(self):
+        try:
+            return await self.reader.read(4096)
+        except ConnectionError:
+            return b""
+
+    async def close(self):
+        if self.writer is None:
+            return
+        writer, self.writer = self.writer, None
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass  # Gegenstelle hat die Verbindung bereits geschlossen
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.transport.abort()
+
+    def unacknowledged(self):
+        if self.writer is None:
+            return 0
+        pending = self.writer.transport.get_write_buffer_size()
+        sock = self.writer.get_extra_info("socket")
+        if fcntl is not None:
+            # TIOCOUTQ: noch nicht von der Gegenstelle bestätigte Bytes im Sendepuffer
+            try:
+                buf = fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, struct.pack("i", 0))
+                return pending + struct.unpack("i", buf)[0]
+            except OSError:
+                pass  # dann wie ohne ioctl den ganzen Sendepuffer annehmen
+        return pending + sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+
+def _load_serial():
+    """Importiert pyserial beim ersten Gebrauch, reine TCP-Nutzung kommt ohne aus."""
+    global serial
+    if serial is None:
+        try:
+            import serial as module
+        except ImportError:
+            raise ImportError("You need to install pyserial. "
+                              "On Debian/Ubuntu try "
+                              "sudo apt-get install python-serial")
+        serial = module
+    return serial
+
+
+class SerialTransport(Transport):
+    """
+    Serielle Verbindung mit RTS/CTS-Handshake.
+
+    pyserial arbeitet blockierend, Schreiben und Lesen laufen deshalb in je
+    einem eigenen Thread. Ein Block gilt erst als geschrieben, wenn er die
+    Schnittstelle verlassen hat (flush), so folgt das Senden dem CTS-Signal.
+    """
+
+    def __init__(self, port, baudrate=9600, write_timeout=WRITE_TIMEOUT):
+        _load_serial()
+        self.port = port
+        self.baudrate = baudrate
+        self.write_timeout = write_timeout
+        self.serial = None
+        self.writer = None
+        self.reader = None
+
+    def _open(self):
+        return serial.Serial(
+            port=self.port,
+            baudrate=self.baudrate,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            bytesize=serial.EIGHTBITS,
+            rtscts=True,
+            dsrdtr=True,
+            timeout=0.1,
+            write_timeout=self.write_timeout
+        )
+
+    def _write(self, data):
+        self.serial.write(data)
+        self.serial.flush()
+
+    def _read(self):
+        while self.serial is not None:
+            data = self.serial.read(self.serial.in_waiting or 1)
+            if data:
+                return data
+        return b""
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self.writer = concurrent.futures.ThreadPoolExecutor(1)
+        self.reader = concurrent.futures.ThreadPoolExecutor(1)
+        self.serial = await loop.run_in_executor(self.writer, self._open)
+
+    async def write(self, data):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.writer, self._write, data)
+
+    async def read(self):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.reader, self._read)
+        except (serial.SerialException, TypeError, AttributeError):
+            return b""  # Schnittstelle wurde währenddessen geschlossen
+
+    async def close(self):
+        if self.serial is None:
+            return
+        port, self.serial = self.serial, None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.writer, port.close)
+        self.writer.shutdown(wait=False)
+        self.reader.shutdown(wait=False)
+
+    def abort(self):
+        if self.serial is not None and hasattr(self.serial, "cancel_write"):
+            self.serial.cancel_write()
+
+    def unacknowledged(self):
+        return self.serial.out_waiting if self.serial is not None else 0
+
+    def __str__(self):
+        return self.port
+
+
+class Transmission:
+    """
+    Ein Sendevorgang über einen Transport.
+
+    Fortschritt kann über on_progress (Callback) oder als asynchroner
+    Iterator über events() verfolgt werden. cancel() darf aus jedem Thread
+    aufgerufen werden.
+
+    :param transport: Noch nicht geöffneter Transport
+    :param hpgl_data: HPGL-Text, wie ihn HPGL.getHPGL() liefert
+    :param chunk_size: Bytes pro Schreibvorgang (Standard: transport.chunk_size)
+    :param on_progress: Callback, erhält höchstens alle progress_interval
+                        Sekunden eine Kopie der aktuellen TransmitStats
+    :param timeout: Maximale Dauer des gesamten Sendevorgangs in Sekunden
+    :param write_timeout: Maximale Wartezeit für einen einzelnen Block
+    :param on_checkpoint: Callback, erhält nach jedem Block den Byte-Offset,
+                          bis zu dem die Gegenstelle die Daten bestätigt hat
+    :param flow_control: Fragt den freien Pufferplatz des Plotters per ESC.B
+                         ab und sendet nur, was hineinpasst. Der Puffer wird
+                         so fast voll gehalten, ohne überzulaufen.
+    :param wait_idle: Wartet mit flow_control am Ende per ESC.O, bis der
+                      Plotter seinen Puffer abgearbeitet hat
+    """
+
+    def __init__(self, transport, hpgl_data, chunk_size=None, on_progress=None,
+                 progress_interval=PROGRESS_INTERVAL, timeout=None,
+                 write_timeout=WRITE_TIMEOUT, trailer=TRAILER, on_checkpoint=None,
+                 flow_control=False, wait_idle=False):
+        self.transport = transport
+        self.commands = job_commands(hpgl_data, trailer)
+        self.chunk_size = chunk_size or transport.chunk_size
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.on_checkpoint = on_checkpoint
+        self.flow_control = flow_control
+        self.wait_idle = wait_idle
+        self.buffer_size = None
+        self.stats = TransmitStats(len(self.commands), sum(map(len, self.commands)))
+        self.received = bytearray()
+        self.loop = None
+        self.task = None
+        self.queue = None
+        self.replies = None
+        self.cancel_requested = False
+
+    def _events(self):
+        """
+        Queue der Fortschrittsmeldungen. Angelegt wird sie von run() oder
+        events(), je nachdem was zuerst läuft, in jedem Fall in der
+        Event-Loop der Übertragung.
+        """
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        return self.queue
+
+    def _emit(self, stats):
+        snapshot = copy.copy(stats)
+        if self.on_progress:
+            self.on_progress(snapshot)
+        self.queue.put_nowait(snapshot)
+
+    async def _read_replies(self):
+        line = bytearray()
+        while True:
+            data = await self.transport.read()
+            if not data:
+                return
+            if self.stats.ack_latency is None:
+                self.stats.ack_latency = time.monotonic() - self.stats.started
+            self.stats.ack_bytes += len(data)
+            self.received.extend(data)
+            line.extend(data)
+            while b"\r" in line:
+                reply, _, rest = bytes(line).partition(b"\r")
+                line = bytearray(rest)
+                self.replies.put_nowait(reply.strip())
+
+    async def _query(self, sequence):
+        """Sendet eine Gerätesteuer-Sequenz und liefert die Antwort als Zahl."""
+        await asyncio.wait_for(self.transport.write(sequence), self.write_timeout)
+        reply = await asyncio.wait_for(self.replies.get(), QUERY_TIMEOUT)
+        return int(reply)
+
+    def _sent(self, block, count, progress):
+        self.stats.commands += count
+        self.stats.bytes += len(block)
+        progress.update(self.stats)
+
+    async def _send_plain(self, progress):
+        for block, count in coalesce(self.commands, self.chunk_size):
+            await asyncio.wait_for(self.transport.write(block), self.write_timeout)
+            self._sent(block, count, progress)
+            if self.on_checkpoint:
+                self.on_checkpoint(self.stats.bytes - self.transport.unacknowledged())
+
+    async def _send_buffered(self, progress):
+        commands = self.commands
+        self.buffer_size = await self._query(ESC_BUFFER_SIZE)
+        free = await self._query(ESC_BUFFER_SPACE)
+        index = 0
+        while index < len(commands):
+            # Ein Befehl, der größer als der ganze Puffer ist, geht nur in einen leeren
+            needed = min(len(commands[index]), self.buffer_size - BUFFER_RESERVE)
+            if free - BUFFER_RESERVE < needed:
+                await asyncio.sleep(BUFFER_POLL)
+                free = await self._query(ESC_BUFFER_SPACE)
+                # Alles vor der Abfrage ist beim Plotter angekommen
+                if self.on_checkpoint:
+                    self.on_checkpoint(self.stats.bytes)
+                continue
+            budget = max(needed, min(free - BUFFER_RESERVE, self.chunk_size))
+            end = index
+            size = 0
+            while end < len(commands) and size + len(commands[end]) <= budget:
+                size += len(commands[end])
+                end += 1
+            end = max(end, index + 1)
+            block = b"".join(commands[index:end])
+            await asyncio.wait_for(self.transport.write(block), self.write_timeout)
+            self._sent(block, end - index, progress)
+            free -= len(block)
+            index = end
+        if self.wait_idle:
+            while not await self._query(ESC_EXTENDED_STATUS) & STATUS_BUFFER_EMPTY:
+                await asyncio.sleep(BUFFER_POLL)
+            if self.on_checkpoint:
+                self.on_checkpoint(self.stats.bytes)
+
+    async def _send(self):
+        progress = Progress(self._emit, self.progress_interval)
+        if self.flow_control:
+            await self._send_buffered(progress)
+        else:
+            await self._send_plain(progress)
+        self.stats.finished = time.monotonic()
+        progress.update(self.stats, force=True)
+
+    async def run(self):
+        """Öffnet den Transport, sendet alle Blöcke und schließt ihn wieder."""
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self._events()
+        self.replies = asyncio.Queue()
+        if self.cancel_requested:
+            self.task.cancel()
+        stats = self.stats
+        started = time.monotonic()
+        replies = None
+        try:
+            await self.transport.open()
+            stats.connect_latency = time.monotonic() - started
+            stats.started = time.monotonic()
+            replies = asyncio.ensure_future(self._read_replies())
+            await asyncio.wait_for(self._send(), self.timeout)
+            await asyncio.wait([replies], timeout=ACK_WAIT)
+        except asyncio.CancelledError:
+            stats.cancelled = True
+            self.transport.abort()
+            raise
+        except Exception:
+            self.transport.abort()
+            raise
+        finally:
+            stats.finished = stats.finished or time.monotonic()
+            if replies is not None:
+                replies.cancel()
+            await self.transport.close()
+            self.queue.put_nowait(None)
+        return stats
+
+    async def events(self):
+        """Asynchroner Iterator über die Fortschrittsmeldungen."""
+        queue = self._events()
+        while True:
+            stats = await queue.get()
+            if stats is None:
+                return
+            yield stats
+
+    def cancel(self):
+        """Bricht die Übertragung ab, auch aus einem anderen Thread."""
+        self.cancel_requested = True
+        if self.loop is not None and self.task is not None:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+
+    def send(self):
+        """
+        Führt die Übertragung blockierend aus, in einer eigenen Event-Loop
+        oder, falls der Transport an eine gebunden ist, in dessen Loop.
+        """
+        try:
+            if self.transport.loop is not None:
+                return asyncio.run_coroutine_threadsafe(self.run(), self.transport.loop).result()
+            return asyncio.run(self.run())
+        except (asyncio.CancelledError, concurrent.futures.CancelledError):
+            return self.stats
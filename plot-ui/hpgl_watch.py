@@ -0,0 +1,232 @@
+# hpgl_watch.py
+"""
+Hot-Folder: bereitet HPGL-Dateien vor, sobald sie gespeichert werden.
+
+Der Watcher beobachtet ein Verzeichnis (z. B. das Exportziel von
+Inkscape). Ist eine .hpgl- oder .plt-Datei fertig geschrieben, wird sie in
+einem Worker-Prozess mit der Standard-Pipeline vorbereitet. Pfade und
+geschätzte Dauer landen im PreparedCache. Öffnet das GUI die Datei danach
+mit denselben Optionen, entfallen Parsen und Vorbereiten. Das GUI bereitet
+immer ohne -m vor: Von mit -m vorbereiteten Dateien übernimmt es nur das
+Parsen, das Ergebnis passt dann für Spooler und plottool.py.
+
+Unter Linux meldet inotify neue Dateien, sonst (oder mit --poll) wird das
+Verzeichnis regelmäßig durchsucht.
+
+    python hpgl_watch.py ~/Plots
+    python hpgl_watch.py ~/Plots -w 300 --poll
+"""
+import concurrent.futures
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from hpgl_cache import CACHE_DIR, PreparedCache
+
+EXTENSIONS = (".hpgl", ".plt")
+POLL_INTERVAL = 1.0  # Sekunden zwischen zwei Blicken ins Verzeichnis bzw. Wartezeit auf inotify
+SETTLE_TIME = 1.0  # Sekunden ohne Änderung, bevor eine Datei beim Durchsuchen als fertig gilt
+
+IN_CLOSE_WRITE = 0x00000008  # zum Schreiben geöffnete Datei wurde geschlossen
+IN_MOVED_TO = 0x00000080  # Datei wurde ins Verzeichnis verschoben (z. B. atomares Speichern)
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len, danach der Name
+
+
+def is_hpgl(name):
+    return name.lower().endswith(EXTENSIONS)
+
+
+def hpgl_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if is_hpgl(name))
+
+
+class InotifyWatch:
+    """Fertig geschriebene Dateien über inotify (Linux), ohne zusätzliche Pakete per ctypes."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+
+    def changes(self, timeout=POLL_INTERVAL):
+        """Geänderte HPGL-Dateien, wartet höchstens timeout Sekunden."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        files = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            path = os.path.join(self.directory, name)
+            if is_hpgl(name) and path not in files:
+                files.append(path)
+        return files
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollWatch:
+    """
+    Durchsucht das Verzeichnis regelmäßig. Eine Datei wird gemeldet, wenn
+    sich Größe oder Änderungszeit geändert haben und danach SETTLE_TIME
+    lang gleich geblieben sind, also das Schreiben abgeschlossen ist.
+    """
+
+    def __init__(self, directory, settle_time=SETTLE_TIME):
+        self.directory = directory
+        self.settle_time = settle_time
+        self.reported = {path: self._stat(path) for path in hpgl_files(directory)}
+        self.changing = {}  # Pfad -> (Größe und Änderungszeit, seit wann unverändert)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def changes(self, timeout=POLL_INTERVAL):
+        time.sleep(timeout)
+        now = time.monotonic()
+        files = []
+        for path in hpgl_files(self.directory):
+            state = self._stat(path)
+            if state is None or state == self.reported.get(path):
+                self.changing.pop(path, None)
+                continue
+            previous, since = self.changing.get(path, (None, now))
+            if state != previous:
+                self.changing[path] = (state, now)
+            elif now - since >= self.settle_time:
+                del self.changing[path]
+                self.reported[path] = state
+                files.append(path)
+        return files
+
+    def close(self):
+        pass
+
+
+def prepare_file(file, options, directory=CACHE_DIR):
+    """
+    Bereitet file vor und legt das Ergebnis im Cache ab (läuft im Worker-Prozess).
+
+    :param options: magic, width, mirror und pen wie im GUI
+    :return: benötigte Sekunden
+    """
+    from hpgl_plotter import HPGLPlotter
+    started = time.monotonic()
+    plotter = HPGLPlotter(file, magic=options.get("magic", False), width=options.get("width"),
+                          pen=options.get("pen", False), log_callback=lambda message: None,
+                          cache=PreparedCache(directory))
+    plotter.setMirror(options.get("mirror", False))  # wie im GUI, der Konstruktor kehrt mirror um
+    plotter.load_hpgl_file()
+    plotter.configure()
+    plotter.estimateTime()
+    return time.monotonic() - started
+
+
+class HotFolder:
+    """
+    :param directory: Beobachtetes Verzeichnis
+    :param options: Optionen für prepare_file(); für sofortiges Öffnen im GUI
+                    dieselben, die dort eingestellt sind (Standard: keine)
+    :param workers: Anzahl paralleler Vorbereitungs-Prozesse
+    :param poll: Verzeichnis durchsuchen statt inotify
+    :param cache_dir: Verzeichnis des PreparedCache
+    :param log_callback: Callback-Funktion für Ausgaben
+    """
+
+    def __init__(self, directory, options=None, workers=1, poll=False, cache_dir=CACHE_DIR,
+                 log_callback=None):
+        self.directory = directory
+        self.options = options or {}
+        self.workers = workers
+        self.poll = poll
+        self.cache_dir = cache_dir
+        self.log = log_callback or print
+        self.preparing = {}  # Pfad -> Future
+        self.again = set()  # während der Vorbereitung erneut geändert
+        self.running = False
+
+    def _watch(self):
+        if not self.poll:
+            try:
+                return InotifyWatch(self.directory)
+            except (OSError, AttributeError) as e:
+                self.log(f"inotify not available ({e}), polling every {POLL_INTERVAL:.1f}s")
+        return PollWatch(self.directory)
+
+    def _submit(self, pool, path):
+        future = self.preparing.get(path)
+        if future is not None and not future.done():
+            self.again.add(path)
+            return
+        future = pool.submit(prepare_file, path, self.options, self.cache_dir)
+        self.preparing[path] = future
+        future.add_done_callback(lambda f, path=path: self._prepared(path, f))
+
+    def _prepared(self, path, future):
+        name = os.path.basename(path)
+        try:
+            self.log(f"Prepared {name} in {future.result():.2f}s")
+        except Exception as e:
+            self.log(f"Preparing {name} failed: {str(e) or type(e).__name__}")
+
+    def run(self):
+        self.running = True
+        watch = self._watch()
+        self.log(f"Watching {self.directory} ({type(watch).__name__})")
+        try:
+            with concurrent.futures.ProcessPoolExecutor(self.workers) as pool:
+                # Vorhandene Dateien einmal vorbereiten, bereits im Cache ist das schnell
+                for path in hpgl_files(self.directory):
+                    self._submit(pool, path)
+                while self.running:
+                    for path in watch.changes(POLL_INTERVAL):
+                        self._submit(pool, path)
+                    for path in list(self.again):
+                        if self.preparing[path].done():
+                            self.again.discard(path)
+                            self._submit(pool, path)
+        finally:
+            watch.close()
+
+    def stop(self):
+        self.running = False
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser("HPGL hot folder")
+    parser.add_argument("directory", help="Directory to watch, e.g. the Inkscape export folder")
+    parser.add_argument("-m", "--magic", action="store_true", help="Enable auto-optimize (the GUI then only reuses the parsed file)")
+    parser.add_argument("-w", "--width", type=int, help="Scale to width in mm")
+    parser.add_argument("--mirror", action="store_true", help="Mirror on X-axis (as the GUI checkbox)")
+    parser.add_argument("--pen", action="store_true", help="Disable cut optimization for rotating knifes")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="Preparation processes")
+    parser.add_argument("--poll", action="store_true", help="Poll the directory instead of using inotify")
+    parser.add_argument("--cache", default=CACHE_DIR, help="Prepared job cache directory")
+    args = parser.parse_args()
+
+    options = {"magic": args.magic, "width": args.width, "mirror": args.mirror, "pen": args.pen}
+    hot_folder = HotFolder(args.directory, options, args.workers, args.poll, args.cache)
+    try:
+        hot_folder.run()
+    except KeyboardInterrupt:
+        hot_folder.stop()
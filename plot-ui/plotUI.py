@@ -1,66 +1,226 @@
+import os
 import re
-import threading
-import socket
+import queue
+import time
+import concurrent.futures
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import ttk
+from hpgl import HPGL
 from hpgl_preview import HPGLPreview
+from hpgl_lod import PathPyramid
+from hpgl_estimate import format_duration
+from hpgl_tiles import TiledPreview
 from hpgl_plotter import HPGLPlotter
-import time
-import subprocess
-import os
-import platform
+from hpgl_cache import PreparedCache
+from hpgl_connection import PlotterConnection
+from hpgl_monitor import ReachabilityMonitor
 from tkinter import messagebox
-import paramiko
+
+UI_POLL_MS = 100  # Abstand, in dem Log und Fortschritt aus der Queue übernommen werden
+LOG_LINES = 1000  # Zeilen, die das Logfenster höchstens behält
+WIDTH_DEBOUNCE_MS = 300  # Ruhezeit nach der letzten Eingabe, bevor neu gerechnet wird
+
+LOG = "log"
+PROGRESS = "progress"
+PATHS = "paths"
+CALL = "call"
 
 def load_hpgl_file(file_path_label, dimensions_label, preview, plotter):
     # HPGL-Datei laden
     global file_path
+    if job_running():
+        return
     file_path = filedialog.askopenfilename(filetypes=[("HPGL Files", "*.hpgl")])
     if file_path:
-        with open(file_path, "r") as file:
-            hpgl_code = file.read()
-            preview.draw(hpgl_code)  # Der Filepath wird jetzt nicht mehr übergeben
-            file_path_label.config(
-                text=f"Dateipfad: {file_path}"
-            )  # Hier wird der file_path angezeigt
-            plotter.openFile(file_path)
-            w, h, l = plotter.getDimensions()
-            dimensions_label.config(
-                text=f"Breite {w:.1f}, Höhe {h:.1f}, Weglänge {l:.1f}"
-            )
+        file_path_label.config(
+            text=f"Dateipfad: {file_path}"
+        )  # Hier wird der file_path angezeigt
+        # Laden und Vorbereiten im Worker, Vorschau und Maße kommen über die Queue zurück
+        start_job(prepare_job, file_path, *current_options(), True)
+
+
+def current_options():
+    """Liest Breite und Spiegelung aus dem GUI (nur im GUI-Thread aufrufen)."""
+    width = None
+    if width_checkbox_var.get() and width_entry.get():
+        width = int(width_entry.get()) or None  # 0 wie leer: Originalgröße
+    return width, bool(mirror_var.get())
+
+
+def prepare_job(file_name, width, mirror, reload=False):
+    """
+    Läuft im Worker-Thread: Datei bei Bedarf laden und mit den aktuellen
+    Optionen vorbereiten. Die Vorschau zeigt danach genau das, was
+    geschnitten wird.
+    """
+    plotter.setWidth(width)
+    plotter.setMirror(mirror)
+    if reload or plotter.file != file_name:
+        plotter.openFile(file_name)
+    plotter.configure()
+    # Eigenes HPGL-Objekt für die Vorschau, das nächste configure() ändert es nicht
+    snapshot = HPGL(None)
+    snapshot.routes = plotter.hpgl_input.getPaths()
+    pyramid = PathPyramid(snapshot.routes)
+    run_in_gui(show_prepared, snapshot, pyramid, plotter.estimateTime(), *plotter.getDimensions())
+
+
+def show_prepared(hpgl, pyramid, estimate, w, h, l):
+    global prepared, job_estimate
+    prepared = (hpgl, pyramid)
+    job_estimate = estimate
+    redraw_preview()
+    show_dimensions(w, h, l)
+    show_duration(estimate.total, remaining=sending_job)  # vor dem Senden neu vorbereitet
+
+
+def show_dimensions(w, h, l):
+    """Zeigt die Maße an, noch unbekannte Werte (None) als "…"."""
+    w, h, l = ("…" if value is None else f"{value:.1f}" for value in (w, h, l))
+    dimensions_label.config(text=f"Breite {w}, Höhe {h}, Weglänge {l}")
+
+
+def show_duration(seconds, remaining=False):
+    """Zeigt die geschätzte (Rest-)Dauer an, None als "…"."""
+    duration = "…" if seconds is None else format_duration(seconds)
+    eta_label.config(text=f"{'Restdauer' if remaining else 'Dauer'} ca. {duration}")
+
+
+def options_changed():
+    """
+    Nach Änderung von Breite oder Spiegelung: Maße sofort aus der
+    Ausgangsgeometrie abschätzen, die eigentliche Neuberechnung erst, wenn
+    WIDTH_DEBOUNCE_MS lang keine weitere Änderung kam.
+    """
+    global refresh_timer
+    if not file_path:
+        return
+    w, h, l = plotter.estimateDimensions(*current_options())
+    if w is not None:
+        show_dimensions(w, h, l)
+    show_duration(None)  # hängt auch von der Reihenfolge der Pfade ab, erst nach der Neuberechnung
+    if refresh_timer is not None:
+        root.after_cancel(refresh_timer)
+    refresh_timer = root.after(WIDTH_DEBOUNCE_MS, refresh_preparation)
+
+
+def redraw_preview():
+    """Zeichnet den vorbereiteten Auftrag als Vektor- oder gekachelte Rastervorschau."""
+    if prepared is None:
+        return
+    if zoom_var.get():
+        preview.forget()  # der Fortschritt wird nur in der Vektor-Vorschau angezeigt
+        tiled_preview.show(*prepared)
+    else:
+        tiled_preview.hide()
+        preview.draw(*prepared)
+
+
+def refresh_preparation():
+    """Bereitet die Datei nach einer Änderung der Optionen neu vor."""
+    global refresh_pending, refresh_timer
+    refresh_timer = None
+    if not file_path:
+        return
+    if job_running():
+        refresh_pending = True  # nach dem laufenden Auftrag nachholen
+        return
+    start_job(prepare_job, file_path, *current_options())
 
 
 def send_hpgl_data(file_name, ip, port):
-    if file_name:
-        if width_checkbox_var.get():
-            width = int(width_entry.get())
-        else:
-            width = None
-        mirror = True
-        plotter_ip = ip.get()
-        plotter_port = int(port.get())
-        plotter = HPGLPlotter(
-            file_path,
-            "",
-            False,
-            width,
-            False,
-            mirror,
-            False,
-            plotter_ip,
-            plotter_port,
-            gui_log,
-        )
-        plotter.run()
+    global refresh_timer
+    if file_name and not job_running():
+        # Der Plotter wurde mit den aktuellen Optionen in der Regel bereits
+        # vorbereitet und die Verbindung zur Interface-Box steht schon,
+        # gesendet wird sofort.
+        plotter.tcp_host = ip.get()
+        plotter.tcp_port = int(port.get())
+        plotter.setResume(bool(resume_var.get()))
+        progress_bar.config(value=0)
+        preview.highlight(0)
+        if refresh_timer is not None:
+            # Optionen eben erst geändert: vor dem Senden noch neu vorbereiten,
+            # sonst würde die alte Geometrie geschnitten
+            root.after_cancel(refresh_timer)
+            refresh_timer = None
+            start_job(prepare_and_send, file_name, *current_options(), sending=True)
+            return
+        if job_estimate is not None:
+            show_duration(job_estimate.total, remaining=True)
+        start_job(plotter.send, sending=True)
+
+
+def prepare_and_send(file_name, width, mirror):
+    """Läuft im Worker-Thread: mit den aktuellen Optionen vorbereiten, dann senden."""
+    prepare_job(file_name, width, mirror)
+    plotter.send()
+
+
+def start_job(function, *args, sending=False):
+    """Führt function im Worker aus, das GUI bleibt währenddessen bedienbar."""
+    global job_future, sending_job
+    sending_job = sending
+    set_busy(True, sending)
+    if lag_meter is not None:
+        lag_meter.start()
+    job_future = executor.submit(function, *args)
+    job_future.add_done_callback(lambda future: run_in_gui(job_finished, future))
+
+
+def job_finished(future):
+    global refresh_pending
+    if sending_job:
+        # Nach einer abgebrochenen Verbindung setzt der nächste Start am Checkpoint fort
+        resume_var.set(1 if plotter.resumable else 0)
+    set_busy(False)
+    error = future.exception()
+    if error is not None:
+        gui_log(f"Error: {str(error) or type(error).__name__}")
+    if lag_meter is not None:
+        lag = lag_meter.stop()
+        gui_log(f"GUI lag during job: max {lag['max_ms']:.0f} ms, "
+                f"mean {lag['mean_ms']:.1f} ms over {lag['ticks']} ticks")
+    if refresh_pending:
+        refresh_pending = False
+        refresh_preparation()
+
+
+def job_running():
+    return job_future is not None and not job_future.done()
+
+
+def set_busy(busy, sending=False):
+    """
+    Sperrt während eines Auftrags Laden und Senden. Beim Senden sind auch
+    die Optionen gesperrt, beim Vorbereiten werden Änderungen danach nachgeholt.
+    """
+    state = "disabled" if busy else "normal"
+    load_button.config(state=state)
+    send_button.config(state=state)
+    options_state = "disabled" if sending else "normal"
+    width_checkbox.config(state=options_state)
+    mirror_checkbox.config(state=options_state)
+    resume_checkbox.config(state=options_state)
+    if width_checkbox_var.get():
+        width_entry.config(state=options_state)
+    cancel_button.config(state="normal" if sending else "disabled")
+
+
+def cancel_job():
+    if plotter.cancel():
+        gui_log("Cancelling...")
 
 
 def toggle_width_entry():
     # Wenn die Checkbox aktiviert ist, das Eingabefeld aktivieren, andernfalls deaktivieren
     if width_checkbox_var.get():
         width_entry.config(state="normal")  # Aktiviert das Eingabefeld
+        if width_entry.get():
+            options_changed()
     else:
-        width_entry.delete(0, tk.END)
+        width_entry.delete(0, tk.END)  # löst über die Validierung die Neuberechnung aus
         width_entry.config(state="disabled")  # Deaktiviert das Eingabefeld
 
 
@@ -70,67 +230,147 @@ def validate_width_input(P):
     if re.match(
         # r"^\d*\.?\d*$", P
         r"^\d+$", P
-    ):  # Erlaubt nur Zahlen (optional mit Dezimalpunkt)
-        # TODO: update Vorberechung der Plotgröße
-        plotter.setWidth(int(P))
-        plotter.configure()
-        w, h, l = plotter.getDimensions()
-        dimensions_label.config(
-            text=f"Breite {w:.1f}, Höhe {h:.1f}, Weglänge {l:.1f}"
-        )
-        return True
-    if P == "":
-        # TODO: hier auf Originalgröße skalieren 
-        plotter.prepare()
-        w, h, l = plotter.getDimensions()
-        dimensions_label.config(
-            text=f"Breite {w:.1f}, Höhe {h:.1f}, Weglänge {l:.1f}"
-        )
+    ) or P == "":  # Erlaubt nur Zahlen (optional mit Dezimalpunkt)
+        # Die Validierung läuft vor der Änderung des Feldes, daher erst danach neu vorbereiten.
+        # Leere Eingabe heißt Originalgröße.
+        root.after_idle(options_changed)
         return True
     return False
 
 
 def gui_log(message):
-    log_widget.insert("end", message + "\n")
-    log_widget.see("end")
+    """Thread-sicher: die Nachricht wird gesammelt und im GUI-Thread ausgegeben."""
+    ui_events.put((LOG, message))
 
 
-def ping_server(ip, status_label):
-    """Pingt den Server zyklisch und aktualisiert das Symbol."""
-    while True:
-        ip_address = ip.get()
-        try:
-            host = socket.gethostbyname(ip_address)
+def show_progress(stats):
+    """Thread-sicher: Fortschritt des laufenden Auftrags."""
+    ui_events.put((PROGRESS, stats))
 
-            # Plattformabhängiger Parameter
-            if os.name == "nt" or platform.system() == "Windows":
-                param = "-n"  # Windows
-            else:
-                param = "-c"  # Linux/Mac
 
-            command = ["ping", "-w", "1000", param, "1", host]
+def show_cut_paths(completed):
+    """Thread-sicher: Anzahl bereits übertragener Pfade für die Vorschau."""
+    ui_events.put((PATHS, completed))
+
 
-            result = subprocess.run(
-                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
+def run_in_gui(function, *args):
+    """Thread-sicher: function wird beim nächsten Leeren der Queue im GUI-Thread aufgerufen."""
+    ui_events.put((CALL, (function, args)))
 
-            try:
-                # Versuch der Dekodierung mit Fehlerersatz
-                output = result.stdout.decode("utf-8", errors="replace")
-            except UnicodeDecodeError:
-                # Fallback, falls UTF-8 nicht funktioniert
-                output = result.stdout.decode("cp1252", errors="replace")
 
-            if result.returncode == 0:
-                status_label.config(text="🔵 Schneideplotter erreichbar", fg="green")
+def drain_ui_events():
+    """
+    Holt alle aufgelaufenen Ereignisse aus der Queue. Lognachrichten werden
+    gesammelt mit einem einzigen insert() ausgegeben, vom Fortschritt und
+    von den geschnittenen Pfaden zählt nur der neueste Stand. Die Vorschau
+    wird so höchstens alle UI_POLL_MS umgefärbt.
+    """
+    lines = []
+    progress = None
+    completed = None
+    try:
+        while True:
+            kind, payload = ui_events.get_nowait()
+            if kind == LOG:
+                lines.append(payload)
+            elif kind == PROGRESS:
+                progress = payload
+            elif kind == PATHS:
+                completed = payload
             else:
-                status_label.config(
-                    text="🔴 Schneideplotter nicht erreichbar", fg="red"
-                )
-        except Exception as e:
-            status_label.config(text="🔴 Fehler beim Pingen", fg="red")
+                flush_log(lines)
+                lines = []
+                function, args = payload
+                try:
+                    function(*args)
+                except Exception as e:
+                    # Ein Fehler in der Anzeige darf das Abholen nicht beenden
+                    name = getattr(function, "__name__", function)
+                    lines.append(f"Error in {name}: {str(e) or type(e).__name__}")
+    except queue.Empty:
+        pass
+    try:
+        flush_log(lines)
+        if progress is not None:
+            progress_bar.config(value=progress.percent)
+        if completed is not None:
+            preview.highlight(completed)
+            if job_estimate is not None:
+                show_duration(job_estimate.remaining(completed), remaining=True)
+    finally:
+        root.after(UI_POLL_MS, drain_ui_events)
 
-        time.sleep(2)
+
+def flush_log(lines):
+    if not lines:
+        return
+    log_widget.insert("end", "\n".join(lines) + "\n")
+    # Nur die letzten Zeilen behalten, sonst wird das Textfeld mit der Zeit träge
+    excess = int(log_widget.index("end-1c").split(".")[0]) - LOG_LINES
+    if excess > 0:
+        log_widget.delete("1.0", f"{excess + 1}.0")
+    log_widget.see("end")
+
+
+class LagMeter:
+    """
+    Misst, wie pünktlich root.after-Rückrufe kommen, als Maß für die
+    Bedienbarkeit des GUI während eines Auftrags.
+
+    :param root: Tk-Hauptfenster
+    :param interval: Abstand der Messungen in ms
+    """
+
+    def __init__(self, root, interval=50):
+        self.root = root
+        self.interval = interval
+        self.lags = []
+        self.expected = None
+        self.timer = None
+
+    def start(self):
+        self.lags = []
+        self.expected = time.monotonic() + self.interval / 1000
+        self.timer = self.root.after(self.interval, self._tick)
+
+    def _tick(self):
+        now = time.monotonic()
+        self.lags.append(max(now - self.expected, 0.0))
+        self.expected = now + self.interval / 1000
+        self.timer = self.root.after(self.interval, self._tick)
+
+    def stop(self):
+        """Beendet die Messung und liefert maximale und mittlere Verspätung."""
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+            self.timer = None
+        lags = self.lags or [0.0]
+        return {"max_ms": max(lags) * 1000, "mean_ms": sum(lags) / len(lags) * 1000,
+                "ticks": len(self.lags)}
+
+
+def update_address(event=None):
+    """Übernimmt geänderte Adresse/Port für Verbindung und Erreichbarkeitsanzeige."""
+    try:
+        port = int(port_entry.get())
+    except ValueError:
+        return
+    monitor.configure(ip_entry.get(), port)
+    connection.configure(ip_entry.get(), port)
+
+
+def poll_status():
+    """Übernimmt Statusänderungen des Monitors in die Anzeige (im GUI-Thread)."""
+    try:
+        while True:
+            reachable, message = status_events.get_nowait()
+            if reachable:
+                status_label.config(text=f"🔵 {message}", fg="green")
+            else:
+                status_label.config(text=f"🔴 {message}", fg="red")
+    except queue.Empty:
+        pass
+    root.after(200, poll_status)
 
 
 def shutdown_raspberry_pi(
@@ -148,6 +388,9 @@ def shutdown_raspberry_pi(
     command = "sudo shutdown now"
 
     try:
+        # paramiko samt Krypto-Bibliotheken erst hier laden, das spart beim Start viel Zeit
+        import paramiko
+
         # Privaten Schlüssel laden
         # private_key = paramiko.RSAKey.from_private_key_file(private_key_path)
 
@@ -179,6 +422,9 @@ def on_close():
         "Das Programm wird geschlossen.\n\n"
         "Möchten Sie den Raspberry Pi des Schneideplotters (WLAN Interface Box) jetzt herunterfahren?",
     )
+    plotter.cancel()
+    executor.shutdown(wait=False)
+    connection.close()
     root.destroy()
 
 
@@ -197,6 +443,13 @@ frame.pack(side="left", padx=10, pady=10)
 canvas = tk.Canvas(frame, width=500, height=500, bg="white")
 canvas.pack()
 
+# Umschalter für die gekachelte Vorschau mit Zoom (Mausrad) und Verschieben (Ziehen)
+zoom_var = tk.IntVar()
+zoom_checkbox = tk.Checkbutton(
+    frame, text="Zoom-Ansicht (Mausrad, Ziehen)", variable=zoom_var, command=redraw_preview
+)
+zoom_checkbox.pack(anchor="w")
+
 # Label für den Dateipfad
 file_path_label = tk.Label(
     frame, text="Dateipfad: Noch keine Datei geladen", anchor="w"
@@ -241,6 +494,10 @@ dimensions_label = tk.Label(
 )
 dimensions_label.pack(pady=10, fill="x")
 
+# Geschätzte Schneidedauer, während des Sendens die Restdauer
+eta_label = tk.Label(options_frame, text="Dauer ca. …", anchor="w")
+eta_label.pack(pady=5, fill="x")
+
 # Checkbox für das Überschreiben der Breite
 width_checkbox_var = tk.IntVar()
 width_checkbox = tk.Checkbutton(
@@ -260,7 +517,9 @@ width_entry.config(state="disabled")  # Standardmäßig deaktiviert
 
 # Checkbox für Option Spiegeln
 mirror_var = tk.IntVar()
-mirror_checkbox = tk.Checkbutton(options_frame, text="Spiegeln", variable=mirror_var)
+mirror_checkbox = tk.Checkbutton(
+    options_frame, text="Spiegeln", variable=mirror_var, command=options_changed
+)
 mirror_checkbox.pack(pady=5, anchor="w")
 
 # Horizontale Trennlinie hinzufügen
@@ -269,6 +528,14 @@ separator.pack(
     fill="x", pady=10
 )  # `fill="x"` sorgt dafür, dass die Trennlinie die gesamte Breite einnimmt
 
+# Checkbox für das Fortsetzen eines abgebrochenen Schnitts, wird nach einem
+# Verbindungsabbruch mit gespeichertem Checkpoint automatisch gesetzt
+resume_var = tk.IntVar()
+resume_checkbox = tk.Checkbutton(
+    options_frame, text="Fortsetzen (ab dem letzten fertigen Pfad)", variable=resume_var
+)
+resume_checkbox.pack(pady=5, anchor="w")
+
 # Button zum Senden der HPGL-Datei
 send_button = tk.Button(
     options_frame,
@@ -277,8 +544,16 @@ send_button = tk.Button(
 )
 send_button.pack(pady=10, anchor="w")
 
+# Fortschritt und Abbruch des laufenden Auftrags
+progress_bar = ttk.Progressbar(options_frame, maximum=100)
+progress_bar.pack(pady=5, fill="x")
+cancel_button = tk.Button(
+    options_frame, text="Abbrechen", command=cancel_job, state="disabled"
+)
+cancel_button.pack(pady=5, anchor="w")
+
 # Button zum Herunterfahren des Schneideplotter-Raspberries
-send_button = tk.Button(
+shutdown_button = tk.Button(
     options_frame,
     text="Raspberry am Schneideplotter herunterfahren",
     command=lambda: shutdown_raspberry_pi(
@@ -286,7 +561,7 @@ send_button = tk.Button(
         "Möchten Sie den Raspberry Pi des Schneideplotters (WLAN Interface Box) jetzt herunterfahren?",
     ),
 )
-send_button.pack(pady=10, anchor="w")
+shutdown_button.pack(pady=10, anchor="w")
 
 # Textfeld für Logausgaben
 log_widget = tk.Text(options_frame, wrap="word", height=10, width=50)
@@ -296,13 +571,40 @@ log_widget.pack(pady=10)
 root.protocol("WM_DELETE_WINDOW", on_close)
 
 # Instanziiere die HPGLPreview-Klasse
-preview = HPGLPreview(canvas, file_path_label)
-
-# Instanziiere die HPGLPlotter-Klasse
-plotter = HPGLPlotter()
-
-# Starte Pinger in eigenem Thread
-threading.Thread(target=ping_server, args=(ip_entry, status_label), daemon=True).start()
+preview = HPGLPreview(canvas, file_path_label, log_callback=gui_log)
+tiled_preview = TiledPreview(canvas, log_callback=gui_log)
+prepared = None
+job_estimate = None
+
+# Log, Fortschritt und Ergebnisse aus Hintergrund-Threads laufen über diese Queue
+ui_events = queue.Queue()
+drain_ui_events()
+
+# Vorbereiten und Senden laufen nacheinander in einem Worker-Thread
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+job_future = None
+sending_job = False
+refresh_pending = False
+refresh_timer = None
+# Verspätung des GUI nur messen, wenn ohnehin profiliert wird
+lag_meter = LagMeter(root) if os.environ.get("HPGL_PROFILE") else None
+
+# Dauerhafte Verbindung zur Interface-Box, wird für alle Aufträge genutzt
+connection = PlotterConnection(ip_entry.get(), int(port_entry.get()), log_callback=gui_log)
+
+# Instanziiere die HPGLPlotter-Klasse, sie bleibt für alle Aufträge bestehen. Der Cache
+# enthält auch, was hpgl_watch.py im Hintergrund vorbereitet hat.
+plotter = HPGLPlotter(mirror=True, log_callback=gui_log, connection=connection,
+                      progress_callback=show_progress, path_callback=show_cut_paths,
+                      cache=PreparedCache())
+
+# Erreichbarkeit der Interface-Box im Hintergrund prüfen, Anzeige im GUI-Thread
+status_events = queue.Queue()
+monitor = ReachabilityMonitor(ip_entry.get(), int(port_entry.get()), status_events, connection)
+for entry in (ip_entry, port_entry):
+    entry.bind("<FocusOut>", update_address)
+    entry.bind("<Return>", update_address)
+poll_status()
 
 # Starten der Tkinter-Anwendung
 root.mainloop()
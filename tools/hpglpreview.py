@@ -1,8 +1,16 @@
 #!/usr/bin/env python
 
 
+import os
+import sys
+import math
+import numpy as N
 import wx
 from wx.lib.floatcanvas import NavCanvas, FloatCanvas
+from wx.lib.floatcanvas.Utilities import BBox
+
+# hpgl.py lives next to the GUI in ../plot-ui
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "plot-ui"))
 import hpgl
 
 HPGL2MM = hpgl.hpgl2mm(1)
@@ -16,6 +24,63 @@ def XYPlotterScale(center):
 	return (-1.0, 1.0)
 
 
+class PathSet(FloatCanvas.LineOnlyMixin, FloatCanvas.DrawObject):
+	"""
+	All paths of a job as a single FloatCanvas object.
+
+	Segments are drawn with one DrawLineList call instead of one object
+	per path, the bounding box is computed once. When zoomed out, points
+	are snapped to a grid of about one pixel and repeated points dropped;
+	the decimated segments are cached per zoom level.
+	"""
+
+	def __init__(self, paths, LineColor="Black", LineStyle="Solid", LineWidth=1, InForeground=False):
+		FloatCanvas.DrawObject.__init__(self, InForeground)
+		lengths = N.array([len(path) for path in paths], dtype=int)
+		self.Points = N.array([point for path in paths for point in path], dtype=float).reshape(-1, 2)
+		ends = N.cumsum(lengths)
+		self.PathStart = N.zeros(len(self.Points), dtype=bool)
+		self.PathStart[ends - lengths] = True
+		self.PathEnd = N.zeros(len(self.Points), dtype=bool)
+		self.PathEnd[ends - 1] = True
+		self.Levels = {}
+
+		self.LineColor = LineColor
+		self.LineStyle = LineStyle
+		self.LineWidth = LineWidth
+		self.SetPen(LineColor, LineStyle, LineWidth)
+		self.CalcBoundingBox()
+
+	def CalcBoundingBox(self):
+		self.BoundingBox = BBox.fromPoints(self.Points)
+		if self._Canvas:
+			self._Canvas.BoundingBoxDirty = True
+
+	def Segments(self, unitsPerPixel):
+		"""Segments as (x0, y0, x1, y1) rows, decimated to about one pixel"""
+		level = int(math.log(unitsPerPixel, 2)) if unitsPerPixel >= 2 else 0
+		if level not in self.Levels:
+			keep = N.ones(len(self.Points), dtype=bool)
+			if level:
+				grid = N.floor(self.Points / 2 ** level)
+				keep[1:] = N.any(grid[1:] != grid[:-1], axis=1)
+				keep |= self.PathStart | self.PathEnd
+			index = N.nonzero(keep)[0]
+			# no segment from the end of one path to the start of the next
+			inside = ~self.PathEnd[index[:-1]]
+			self.Levels[level] = N.hstack((self.Points[index[:-1]][inside], self.Points[index[1:]][inside]))
+		return self.Levels[level]
+
+	def _Draw(self, dc, WorldToPixel, ScaleWorldToPixel, HTdc=None):
+		unitsPerPixel = 1.0 / abs(ScaleWorldToPixel((1.0, 1.0))[0])
+		segments = self.Segments(unitsPerPixel)
+		if not len(segments):
+			return
+		pixels = WorldToPixel(segments.reshape(-1, 2)).reshape(-1, 4)
+		dc.SetPen(self.Pen)
+		dc.DrawLineList(pixels)
+
+
 class HPGLPreview(wx.Frame):
 
 	def __init__(self, hpgldata, title="HPGL preview", size=(1200, 700), dialog=False, *args, **kwargs):
@@ -41,12 +106,14 @@ class HPGLPreview(wx.Frame):
 
 		self.SetSizer(self.sizer)
 
+		paths = hpgldata.getPaths()
 		last = (0, 0)
-		for line in hpgldata.getPaths():
-			self.Canvas.Canvas.AddLine(line)
-
-			self.Canvas.Canvas.AddLine([last, line[0]], LineColor="blue")
+		travel = []
+		for line in paths:
+			travel.append([last, line[0]])
 			last = line[-1]
+		self.Canvas.Canvas.AddObject(PathSet(paths))
+		self.Canvas.Canvas.AddObject(PathSet(travel, LineColor="blue"))
 		self.Canvas.Canvas.AddLine([last, (0, 0)], LineColor="green")
 		m, mm = hpgldata.getBoundingBox()
 
@@ -4,7 +4,13 @@
 import sys
 import os
 import argparse
-from hpgl import HPGL
+
+# hpgl.py and the transmission engine live next to the GUI in ../plot-ui
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "plot-ui"))
+from hpgl import HPGL, Pipeline, prepare_options
+from hpgl_transport import SerialTransport, TCPTransport, Transmission, format_summary
+from hpgl_job import Job, Checkpoint
+from hpgl_reroute import use_choose_route
 try:
 	import serial
 except:
@@ -21,11 +27,15 @@ except NameError:
 
 parser = argparse.ArgumentParser(description="Process all arguments ")
 parser.add_argument("-p", "--port", metavar="PORT", type=str, help="Serial port (default: /dev/ttyUSB0)", default="/dev/ttyUSB0")
+parser.add_argument("--tcp", metavar="HOST:PORT", type=str, help="Send over TCP (e.g. the WLAN interface box) instead of the serial port")
 parser.add_argument("-m", "--magic", action="store_true", help="Enable auto-optimize")
 parser.add_argument("-w", "--width", metavar="WIDTH", type=int, help="Scale to width in mm")
 parser.add_argument("-v", "--preview", action="store_true", help="Show preview window before plotting")
 parser.add_argument("--mirror", action="store_true", help="Mirror on X-axis for inverted cuts (T-Shirts etc.)")
 parser.add_argument("--pen", action="store_true", help="Disable cut optimization for rotating knifes")
+parser.add_argument("--flow-control", action="store_true", help="Query the plotter buffer (ESC.B) and only send what fits")
+parser.add_argument("--reroute-budget", metavar="SECONDS", type=float, help="With -m, compare path order strategies for this long and keep the best")
+parser.add_argument("--resume", action="store_true", help="Continue an interrupted job after the last completed path")
 parser.add_argument("file", type=str, help="the HPGL-file you want to plot")
 args = parser.parse_args()
 
@@ -37,46 +47,12 @@ except:
 	raise
 
 
-# do optimize stuff:
-blade_optimize = False
-optimize = False
-reroute = False
-rotate180 = False
-mirror = True
-margin = 5
-
-if args.mirror:
-	mirror = False
-
-if args.magic:
-	blade_optimize = True
-	reroute = True
-	optimize = True
-	rotate180 = True
-
-if args.width is not None:
-	HPGLinput.scaleToWidth(args.width)
-
-if args.pen:
-	blade_optimize = False
-
-if rotate180:
-	HPGLinput.mirrorX()
-	HPGLinput.mirrorY()
-
-if mirror:
-	HPGLinput.mirrorX()
-
-if optimize:
-	HPGLinput.optimize()
-	HPGLinput.fit()
-
-if blade_optimize:
-	HPGLinput.optimizeCut(0.25)
-	HPGLinput.bladeOffset(0.25)
-
-if reroute:
-	HPGLinput.rerouteXY()
+# do optimize stuff (mirrored unless --mirror, the GUI checkbox and hpgl_watch.py --mirror mean the opposite):
+options = prepare_options(args.magic, args.width, not args.mirror, args.pen)
+options["reroute_budget"] = args.reroute_budget if args.magic else None
+pipeline = Pipeline()
+use_choose_route(pipeline)
+pipeline.run(HPGLinput, options, source=args.file)
 
 
 print("Plotting file: " + args.file)
@@ -102,37 +78,52 @@ except KeyboardInterrupt:
 if cont != "y":
 	exit(0)
 
-print("Using port: {}".format(args.port))
+if args.tcp:
+	host, port = args.tcp.rsplit(":", 1)
+	transport = TCPTransport(host, int(port))
+	print("Using {}".format(args.tcp))
+else:
+	transport = SerialTransport(args.port)
+	print("Using port: {}".format(args.port))
+
+job = Job.from_hpgl(HPGLinput)
+checkpoint = Checkpoint(job)
+if args.resume:
+	completed = checkpoint.load()
+	if completed:
+		print("Resuming after path {}/{}".format(completed, job.total))
+		job = job.resume(completed)
+	else:
+		print("No checkpoint found, sending the whole job.")
 
-HPGLdata = HPGLinput.getHPGL()
+HPGLdata = job.data
 print("{} characters loaded".format(len(HPGLdata)))
 
-try:
-	port = serial.Serial(
-		port=args.port,
-		baudrate=9600,
-		parity=serial.PARITY_NONE,
-		stopbits=serial.STOPBITS_ONE,
-		bytesize=serial.EIGHTBITS,
-		rtscts=True,
-		dsrdtr=True
-	   )
-
-	splitted = HPGLdata.split(";")
-	total = len(splitted)
+def show_progress(stats):
+	sys.stdout.write("\rsending... {percent:.1f}% done ({done}/{total})".format(percent=stats.percent, done=stats.commands, total=stats.total_commands))
+	sys.stdout.flush()
 
+try:
 	sys.stdout.write("starting...")
-
-	for i, command in enumerate(splitted):
-		sys.stdout.write("\rsending... {percent:.1f}% done ({done}/{total})".format(percent=(i + 1) * 100.0 / total, done=i + 1, total=total))
-		sys.stdout.flush()
-		# ignore empty
-		if not command:
-			continue
-		port.write(command.encode() + b";")
-	port.write("PU0,0;SP0;SP0;")
+	transmission = Transmission(transport, HPGLdata, on_progress=show_progress,
+		on_checkpoint=lambda offset: checkpoint.update(job.completed(offset)), flow_control=args.flow_control)
+	stats = transmission.send()
 	sys.stdout.write("\n")
+	print(format_summary(stats))
+	if stats.cancelled:
+		checkpoint.flush()
+	else:
+		checkpoint.clear()
 except serial.serialutil.SerialException:
+	checkpoint.flush()
 	print("Failed to open port {}.".format(args.port))
+except Exception as e:
+	# e.g. the WLAN connection dropped, the checkpoint has the completed paths
+	sys.stdout.write("\n")
+	checkpoint.flush()
+	print("Sending failed: {}, continue later with --resume".format(str(e) or type(e).__name__))
+except KeyboardInterrupt:
+	checkpoint.flush()
+	print("\ncancelled, continue later with --resume")
 
 __author__ = "doommaster"